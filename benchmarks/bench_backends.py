@@ -0,0 +1,67 @@
+"""
+Throughput of the reportlab canvas backend and the direct PDF writer backend,
+in pages per second (drawing and saving).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_backends
+"""
+import os
+import time
+import tempfile
+import numpy as np
+
+from patternedPDF import PatternedPDF
+
+BACKENDS = ['reportlab', 'direct']
+PAPERS = {'A5': (148, 210), 'A4': (210, 297), 'A3': (297, 420)}
+CASES = [
+    # paper, grid size, pattern, table, pages
+    ('A5', 5, 'blank', None, 1),
+    ('A4', 7.5, 'grid', 'table', 1),
+    ('A4', 7.5, 'dotted', 'table', 1),
+    ('A4', 7.5, 'ruled', None, 1),
+    ('A4', 2, 'grid', None, 1),
+    ('A3', 1, 'grid', 'table', 1),
+    ('A4', 5, 'grid', 'table', 200),
+]
+MIN_TIME = 1.0          # seconds spent on each case and backend
+
+
+def render(folder, backend, paper, grid_size, pattern, table, pages):
+    paper_width, paper_height = PAPERS[paper]
+    patterned_pdf = PatternedPDF(folder, f'{backend} {paper} {grid_size} {pattern} {table} {pages}',
+                                 paper_width, paper_height, pattern, table,
+                                 np.array([210, 210, 210, 150]) / 255, np.array([196, 21, 30, 178]) / 255,
+                                 np.array([255, 255, 255, 255]) / 255, np.array([0, 0, 0, 25]) / 255,
+                                 grid_size, 0.1, 0.25, 5, 5, 15, 4, 2, 3, np.array([0, 0, 0, 0]),
+                                 pages=pages, backend=backend)
+    patterned_pdf.create_patterned_pdf().save()
+    return os.path.getsize(patterned_pdf.pdf_path)
+
+
+def pages_per_second(folder, backend, case):
+    # Render the case repeatedly for at least MIN_TIME seconds
+    render(folder, backend, *case)                  # warm up imports and caches
+    runs = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < MIN_TIME:
+        size = render(folder, backend, *case)
+        runs += 1
+    return runs * case[-1] / (time.perf_counter() - start), size
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        print(f'{"case":<30}' + ''.join(f'{backend + " (pages/s)":>22}{"bytes":>9}' for backend in BACKENDS)
+              + f'{"speedup":>9}')
+        for case in CASES:
+            paper, grid_size, pattern, table, pages = case
+            results = [pages_per_second(folder, backend, case) for backend in BACKENDS]
+            name = f'{paper} {grid_size} mm {pattern}{" + table" if table else ""}, {pages} p'
+            print(f'{name:<30}' + ''.join(f'{rate:>22.1f}{size:>9}' for rate, size in results)
+                  + f'{results[1][0] / results[0][0]:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare multi-page notebooks that reference one form XObject per page with
+notebooks that redraw every page.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_notebook
+"""
+import os
+import time
+import tempfile
+import numpy as np
+from reportlab.pdfgen import canvas
+
+from patternedPDF import PatternedPDF
+
+
+class RedrawPDF(PatternedPDF):
+    """PatternedPDF drawing the full page content again on every page."""
+
+    def create_patterned_pdf(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        pdf = canvas.Canvas(self.pdf_path, pagesize=[self.paper_width, self.paper_height])
+        for _ in range(self.pages):
+            self.draw_page(pdf)
+            pdf.showPage()
+        return pdf
+
+
+PAGES = [1, 50, 200, 500]
+PATTERNS = ['grid', 'dotted', 'ruled']
+
+
+def render(cls, folder, pattern, pages):
+    patterned_pdf = cls(folder, f'{cls.__name__} {pattern} {pages}', 210, 297, pattern, 'table',
+                        np.array([210, 210, 210, 150]) / 255, np.array([196, 21, 30, 178]) / 255,
+                        np.array([255, 255, 255, 255]) / 255, np.array([210, 210, 210, 255]) / 255,
+                        5, 0.1, 0.25, 5, 5, 15, 4, 1, 2, np.array([0, 0, 0, 0]), pages=pages)
+    start = time.perf_counter()
+    patterned_pdf.create_patterned_pdf().save()
+    elapsed = time.perf_counter() - start
+    return elapsed, os.path.getsize(patterned_pdf.pdf_path)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        print(f'{"pattern":<8}{"pages":>6}{"redraw (ms)":>13}{"redraw (KB)":>13}{"form (ms)":>11}{"form (KB)":>11}'
+              f'{"speedup":>9}{"size":>7}')
+        for pattern in PATTERNS:
+            for pages in PAGES:
+                redraw_time, redraw_size = render(RedrawPDF, folder, pattern, pages)
+                form_time, form_size = render(PatternedPDF, folder, pattern, pages)
+                print(f'{pattern:<8}{pages:>6}{redraw_time * 1000:>13.1f}{redraw_size / 1024:>13.1f}'
+                      f'{form_time * 1000:>11.1f}{form_size / 1024:>11.1f}'
+                      f'{redraw_time / form_time:>8.1f}x{redraw_size / form_size:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
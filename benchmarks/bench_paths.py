@@ -0,0 +1,86 @@
+"""
+Compare the batched single-path renderer with the old line-by-line renderer.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_paths
+"""
+import time
+import tempfile
+import numpy as np
+
+from patternedPDF import PatternedPDF
+from benchmarks.content_stream import count_operators
+
+
+class PerLinePDF(PatternedPDF):
+    """PatternedPDF drawing one stroked `pdf.line` per grid line, as before batching."""
+
+    def draw_horizontal_lines(self, pdf):
+        for y in self.geometry.y:
+            if self.margin[0] == 0 and y == 0:
+                pass
+            elif self.margin[2] == 0 and y == self.paper_height:
+                pass
+            else:
+                pdf.line(self.x1, y, self.x2, y)
+
+    def draw_grid(self, pdf):
+        self.x1 = self.geometry.x[0]
+        self.x2 = self.geometry.x[-1]
+        self.draw_horizontal_lines(pdf)
+
+        self.y1 = self.geometry.y[0]
+        self.y2 = self.geometry.y[-1]
+
+        for x in self.geometry.x:
+            if self.margin[1] == 0 and x == 0:
+                pass
+            elif self.margin[3] == 0 and x == self.paper_width:
+                pass
+            else:
+                pdf.line(x, self.y1, x, self.y2)
+
+
+PAPERS = {'A4': (210, 297), 'A3': (297, 420), 'A0': (841, 1189)}
+CASES = [('A4', 7.5), ('A3', 2), ('A0', 1)]
+PATTERNS = ['grid', 'dotted', 'ruled']
+REPEAT = 3
+
+
+def render(cls, folder, paper, grid_size, pattern):
+    paper_width, paper_height = PAPERS[paper]
+    patterned_pdf = cls(folder, f'{cls.__name__} {paper} {grid_size} {pattern}', paper_width, paper_height, pattern, None,
+                        np.array([210, 210, 210, 150]) / 255, np.array([196, 21, 30, 178]) / 255,
+                        np.array([255, 255, 255, 255]) / 255, np.array([210, 210, 210, 255]) / 255,
+                        grid_size, 0.1, 0.25, 5, 5, 15, 4, 1, 2, np.array([0, 0, 0, 0]))
+    start = time.perf_counter()
+    doc = patterned_pdf.create_patterned_pdf()
+    drawn = time.perf_counter()
+    doc.save()
+    saved = time.perf_counter()
+    with open(patterned_pdf.pdf_path, 'rb') as f:
+        data = f.read()
+    return drawn - start, saved - start, len(data), sum(count_operators(data).values())
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        print(f'{"case":<22}{"renderer":<14}{"draw (ms)":>10}{"total (ms)":>11}{"bytes":>8}{"operators":>11}'
+              f'{"speedup":>9}')
+        for paper, grid_size in CASES:
+            for pattern in PATTERNS:
+                results = {}
+                for cls in (PerLinePDF, PatternedPDF):
+                    runs = [render(cls, folder, paper, grid_size, pattern) for _ in range(REPEAT)]
+                    results[cls] = (min(r[0] for r in runs), min(r[1] for r in runs), runs[0][2], runs[0][3])
+
+                base_time = results[PerLinePDF][0]
+                for cls, (draw_time, total_time, size, operators) in results.items():
+                    case = f'{paper} {grid_size} mm {pattern}'
+                    print(f'{case:<22}{cls.__name__:<14}{draw_time * 1000:>10.1f}{total_time * 1000:>11.1f}{size:>8}'
+                          f'{operators:>11}{base_time / draw_time:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
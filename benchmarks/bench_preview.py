@@ -0,0 +1,71 @@
+"""
+Thumbnails per minute of the NumPy preview rasterizer, against rendering the PDF and
+rasterizing it with PyMuPDF when that is installed.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_preview
+"""
+import time
+import numpy as np
+
+from patternedPDF import PatternedPDF
+
+PAPERS = {'A5': (148, 210), 'A4': (210, 297), 'A3': (297, 420)}
+CASES = [
+    # paper, grid size, pattern, table, dpi
+    ('A4', 7.5, 'blank', None, 36),
+    ('A4', 7.5, 'grid', 'table', 36),
+    ('A4', 7.5, 'dotted', 'table', 36),
+    ('A4', 7.5, 'ruled', None, 36),
+    ('A4', 2, 'grid', None, 36),
+    ('A4', 5, 'dotted', None, 96),
+    ('A3', 5, 'grid', 'table', 150),
+]
+MIN_TIME = 1.0          # seconds spent on each case and method
+
+
+def template(paper, grid_size, pattern, table):
+    paper_width, paper_height = PAPERS[paper]
+    return PatternedPDF(None, 'preview', paper_width, paper_height, pattern, table,
+                        np.array([210, 210, 210, 150]) / 255, np.array([196, 21, 30, 178]) / 255,
+                        np.array([255, 255, 255, 255]) / 255, np.array([0, 0, 0, 25]) / 255,
+                        grid_size, 0.1, 0.25, 5, 5, 15, 4, 2, 3, np.array([0, 0, 0, 0]), backend='direct')
+
+
+def numpy_preview(patterned_pdf, dpi):
+    return patterned_pdf.to_png(dpi)
+
+
+def pdf_preview(patterned_pdf, dpi):
+    import fitz
+    return fitz.open(stream=patterned_pdf.to_bytes())[0].get_pixmap(dpi=dpi).tobytes('png')
+
+
+def per_minute(method, case):
+    # Render the case repeatedly for at least MIN_TIME seconds
+    patterned_pdf = template(*case[:4])
+    method(patterned_pdf, case[4])                  # warm up imports and caches
+    runs = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < MIN_TIME:
+        method(patterned_pdf, case[4])
+        runs += 1
+    return runs * 60 / (time.perf_counter() - start)
+
+
+def main():
+    try:
+        import fitz
+        methods = [('numpy', numpy_preview), ('pdf + mupdf', pdf_preview)]
+    except ImportError:
+        methods = [('numpy', numpy_preview)]
+    print(f'{"case":<34}' + ''.join(f'{name + " (/min)":>20}' for name, _ in methods))
+    for case in CASES:
+        paper, grid_size, pattern, table, dpi = case
+        name = f'{paper} {grid_size} mm {pattern}{" + table" if table else ""}, {dpi} dpi'
+        print(f'{name:<34}' + ''.join(f'{per_minute(method, case):>20.0f}' for _, method in methods))
+
+
+if __name__ == '__main__':
+    main()
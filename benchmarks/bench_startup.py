@@ -0,0 +1,46 @@
+"""
+Measure import time of the library modules and cold-start time of the CLI.
+
+Each command runs in a fresh interpreter; the median of several runs is reported.
+Run from the repository root:
+
+    python -m benchmarks.bench_startup
+"""
+import sys
+import time
+import statistics
+import subprocess
+
+RUNS = 7
+SPEC = 'sweeps/a4_7.5mm_white.json'
+COMMANDS = [
+    ('interpreter only', [sys.executable, '-c', 'pass']),
+    ('import numpy + reportlab', [sys.executable, '-c', 'import numpy, reportlab.pdfgen.canvas']),
+    ('import patternedPDF', [sys.executable, '-c', 'import patternedPDF']),
+    ('import sweep', [sys.executable, '-c', 'import sweep']),
+    ('import convert_color', [sys.executable, '-c', 'import convert_color']),
+    ('CLI --help', [sys.executable, '-m', 'generate_templates', '--help']),
+    ('CLI --dry-run', [sys.executable, '-m', 'generate_templates', SPEC, '--dry-run']),
+]
+
+
+def cold_start(command):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    baseline = None
+    print(f'{"command":<28}{"median (ms)":>12}{"over interpreter (ms)":>23}')
+    for label, command in COMMANDS:
+        elapsed = cold_start(command)
+        baseline = baseline if baseline is not None else elapsed
+        print(f'{label:<28}{elapsed * 1000:>12.1f}{(elapsed - baseline) * 1000:>23.1f}')
+
+
+if __name__ == '__main__':
+    main()
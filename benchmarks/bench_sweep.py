@@ -0,0 +1,41 @@
+"""
+Measure how the parallel sweep scales with the number of worker processes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_sweep
+"""
+import os
+import tempfile
+import numpy as np
+
+from sweep import expand_grid, run_sweep
+
+
+def catalogue(folder):
+    base = dict(output_folder=folder, paper_width=210, paper_height=297, pattern2='table',
+                grid_color=np.array([210, 210, 210, 150]) / 255, line_color=np.array([196, 21, 30, 178]) / 255,
+                bg_color=np.array([255, 255, 255, 102]) / 255, table_color=np.array([210, 210, 210, 25]) / 255,
+                grid_size=2, grid_line_width=0.1, line_width=0.25, rows=1, columns=2, margin=np.array([0, 0, 0, 0]))
+    return expand_grid(dict(title_perc=[0, 4, 8], cue_perc_left=[0, 5, 15], cue_perc_right=[0, 5, 15],
+                            summary_perc=[0, 15], pattern=['grid', 'dotted', 'blank', 'ruled']),
+                       base, '{pattern} {title_perc} {cue_perc_left}-{cue_perc_right} {summary_perc}')
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    with tempfile.TemporaryDirectory() as folder:
+        jobs = catalogue(folder)
+        print(f'{len(jobs)} templates, {cpus} CPUs')
+        print(f'{"workers":>8}{"time (s)":>10}{"templates/s":>13}{"speedup":>9}')
+        base_time = None
+        for workers in counts:
+            result = run_sweep(jobs, workers=workers, progress=None)
+            base_time = base_time or result.elapsed
+            print(f'{workers:>8}{result.elapsed:>10.2f}{len(jobs) / result.elapsed:>13.1f}'
+                  f'{base_time / result.elapsed:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Compare the batched table drawing with the old one stroke per table line, on tables up to 100 x 100
+cells, uniform and with weighted rows and columns under merged header bands.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_table
+"""
+import time
+import numpy as np
+
+from patternedPDF import PatternedPDF, mm
+from page_geometry import PageGeometry
+from benchmarks.content_stream import count_operators
+
+
+class PerLineTablePDF(PatternedPDF):
+    """PatternedPDF drawing one stroked `pdf.line` per table line, as before batching."""
+
+    def draw_table(self, pdf):
+        geometry = self.geometry
+        for y in geometry.table_rows_y:
+            pdf.line(geometry.table_x1, y, geometry.table_x2, y)
+        for x, y1, y2 in zip(*geometry.table_vertical):
+            pdf.line(x, y1, x, y2)
+
+
+PAPERS = {'A4': (210, 297), 'A3': (297, 420), 'A0': (841, 1189)}
+CASES = [
+    # paper, grid size, rows, columns, weighted with header bands
+    ('A4', 5, 10, 10, False),
+    ('A3', 1, 100, 100, False),
+    ('A0', 2, 100, 100, False),
+    ('A0', 2, 100, 100, True),
+]
+BACKENDS = ['reportlab', 'direct']
+REPEAT = 5
+
+
+def table_options(rows, columns, weighted):
+    # Planner-like table: a wide first column, taller header rows and a title band over week groups of 7 columns
+    if not weighted:
+        return {}
+    weeks = [7] * (columns // 7) + ([columns % 7] if columns % 7 else [])
+    return dict(row_weights=[3, 2] + [1] * (rows - 2), column_weights=[4] + [1] * (columns - 1),
+                header_bands=[[columns], [1, columns - 1], weeks])
+
+
+def template(cls, paper, grid_size, rows, columns, weighted, backend):
+    paper_width, paper_height = PAPERS[paper]
+    return cls(None, 'table', paper_width, paper_height, 'blank', 'table',
+               np.array([210, 210, 210, 150]) / 255, np.array([196, 21, 30, 178]) / 255,
+               np.array([255, 255, 255, 255]) / 255, np.array([0, 0, 120, 200]) / 255,
+               grid_size, 0.1, 0.25, 0, 0, 0, 4, rows, columns, np.array([5, 5, 5, 5]),
+               backend=backend, **table_options(rows, columns, weighted))
+
+
+def layout_time(paper, grid_size, rows, columns, weighted):
+    # Seconds to lay out the table (geometry without the lru_cache of page_geometry.layout)
+    paper_width, paper_height = PAPERS[paper]
+    options = table_options(rows, columns, weighted)
+    args = (paper_width * mm, paper_height * mm, grid_size * mm, (5 * mm,) * 4, 4, 0, 0, 0, 0.25 * mm, rows, columns,
+            options.get('row_weights'), options.get('column_weights'), options.get('header_bands'))
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        PageGeometry(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def render(cls, case, backend):
+    # Best draw time of the table phase, and the size and operator count of the PDF
+    best = float('inf')
+    for _ in range(REPEAT):
+        patterned_pdf = template(cls, *case, backend)
+        pdf = patterned_pdf.create_canvas(None)
+        patterned_pdf.draw_background(pdf)
+        start = time.perf_counter()
+        patterned_pdf.draw_overlay(pdf)
+        best = min(best, time.perf_counter() - start)
+    data = template(cls, *case, backend).to_bytes()
+    return best, len(data), sum(count_operators(data).values())
+
+
+def main():
+    print(f'{"case":<34}{"layout (ms)":>12}{"backend":>11}{"renderer":>17}{"draw (ms)":>11}{"bytes":>9}'
+          f'{"operators":>11}{"speedup":>9}')
+    for case in CASES:
+        paper, grid_size, rows, columns, weighted = case
+        name = f'{paper} {grid_size} mm {rows}x{columns}{" weighted + header" if weighted else ""}'
+        layout = layout_time(*case) * 1000
+        for backend in BACKENDS:
+            results = {cls: render(cls, case, backend) for cls in (PerLineTablePDF, PatternedPDF)}
+            base_time = results[PerLineTablePDF][0]
+            for cls, (draw_time, size, operators) in results.items():
+                print(f'{name:<34}{layout:>12.2f}{backend:>11}{cls.__name__:>17}{draw_time * 1000:>11.2f}{size:>9}'
+                      f'{operators:>11}{base_time / draw_time:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
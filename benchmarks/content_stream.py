@@ -0,0 +1,41 @@
+import re
+import zlib
+import base64
+
+STREAM_RE = re.compile(rb'<<(.*?)>>\s*stream\r?\n(.*?)endstream', re.S)
+TOKEN_RE = re.compile(rb'\((?:\\.|[^\\)])*\)|<[^<>]*>|\[|\]|/[^\s/\[\]()<>]+|[^\s/\[\]()<>]+')
+NUMBER_RE = re.compile(rb'^[+-]?(\d+\.?\d*|\.\d+)$')
+
+
+def decode_stream(dictionary, data):
+    """Undo the ASCII85 and Flate filters reportlab applies to content streams."""
+    if b'/ASCII85Decode' in dictionary:
+        data = data.strip()
+        if data.endswith(b'~>'):
+            data = data[:-2]
+        data = base64.a85decode(data.replace(b'\n', b'').replace(b'\r', b''))
+    if b'/FlateDecode' in dictionary:
+        data = zlib.decompress(data)
+    return data
+
+
+def content_streams(pdf_bytes):
+    """Return the decoded page and form content streams of a PDF file."""
+    streams = []
+    for dictionary, data in STREAM_RE.findall(pdf_bytes):
+        if b'/Length1' in dictionary or b'/Subtype /Image' in dictionary:
+            continue
+        streams.append(decode_stream(dictionary, data))
+    return streams
+
+
+def count_operators(pdf_bytes):
+    """Count the content-stream operators in a PDF, e.g. {'m': 40, 'l': 40, 'S': 2}."""
+    counts = {}
+    for stream in content_streams(pdf_bytes):
+        for token in TOKEN_RE.findall(stream):
+            if token[:1] in b'(<[]/' or NUMBER_RE.match(token):
+                continue
+            op = token.decode('latin-1')
+            counts[op] = counts.get(op, 0) + 1
+    return counts
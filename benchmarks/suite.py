@@ -0,0 +1,210 @@
+"""
+Benchmark suite: render cost of PatternedPDF over a matrix of patterns, tables, paper sizes,
+grid sizes and page counts, with a comparison mode to catch regressions.
+
+Run from the repository root:
+
+    python -m benchmarks.suite run --output bench.json                  # full matrix
+    python -m benchmarks.suite run --output bench.json --quick          # A6/A4/A0, one grid size, 1 page
+    python -m benchmarks.suite run --output bench.json --papers A4 A0 --backend direct
+    python -m benchmarks.suite compare before.json after.json           # exit status 1 on regressions
+
+Each case is rendered with create_patterned_pdf() and save(). The suite records the median and
+minimum wall time over --repeat runs, the peak memory traced by tracemalloc during a separate run,
+the output size in bytes and the content-stream operator counts.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+import itertools
+
+from page_geometry import PAPERS
+
+PATTERNS = ['grid', 'dotted', 'ruled', 'blank']
+TABLES = [None, 'table']
+GRID_SIZES = [2, 5, 7.5]
+PAGES = [1, 50]
+QUICK = dict(papers=['A6', 'A4', 'A0'], grid_sizes=[5], pages=[1])
+
+RESULTS_VERSION = 1
+
+
+def cases(patterns=PATTERNS, tables=TABLES, papers=PAPERS, grid_sizes=GRID_SIZES, pages=PAGES):
+    """Expand the benchmark matrix into a list of case dicts."""
+    return [dict(pattern=pattern, table=table, paper=paper, grid_size=grid_size, pages=page_count)
+            for pattern, table, paper, grid_size, page_count in itertools.product(patterns, tables, papers, grid_sizes, pages)]
+
+
+def case_id(case):
+    return (f"{case['paper']} {case['grid_size']:g} mm {case['pattern']}{' + table' if case['table'] else ''} "
+            f"x{case['pages']}")
+
+
+def make_pdf(folder, case, **options):
+    import numpy as np
+    from patternedPDF import PatternedPDF
+
+    paper_width, paper_height = PAPERS[case['paper']]
+    return PatternedPDF(folder, 'bench', paper_width, paper_height, case['pattern'], case['table'],
+                        np.array([210, 210, 210, 150]) / 255, np.array([196, 21, 30, 178]) / 255,
+                        np.array([255, 255, 255, 255]) / 255, np.array([0, 0, 0, 25]) / 255,
+                        case['grid_size'], 0.1, 0.25, 5, 5, 15, 4, 3, 2, np.array([0, 0, 0, 0]),
+                        pages=case['pages'], **options)
+
+
+def measure(folder, case, repeat, **options):
+    """Render one case: timed runs, then one run under tracemalloc for the peak memory."""
+    from benchmarks.content_stream import count_operators
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        patterned_pdf = make_pdf(folder, case, **options)
+        patterned_pdf.create_patterned_pdf().save()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    make_pdf(folder, case, **options).create_patterned_pdf().save()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    with open(patterned_pdf.pdf_path, 'rb') as f:
+        data = f.read()
+    operators = count_operators(data)
+    return dict(case, id=case_id(case), time_s=statistics.median(times), time_min_s=min(times),
+                peak_bytes=peak, bytes=len(data), operators=sum(operators.values()),
+                operator_counts=dict(sorted(operators.items())))
+
+
+def environment():
+    """Versions and machine details stored with the results."""
+    import numpy
+    import reportlab
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = ''
+    return dict(python=platform.python_version(), numpy=numpy.__version__, reportlab=reportlab.Version,
+                platform=platform.platform(), cpus=os.cpu_count(), commit=commit or None,
+                time=time.strftime('%Y-%m-%dT%H:%M:%S%z'))
+
+
+def run(matrix, repeat=3, progress=True, **options):
+    """
+    Run the benchmark matrix.
+
+    :param matrix:      List of case dicts, e.g. from cases()
+    :param repeat:      Timed runs per case
+    :param progress:    Print one line per case on stderr
+    :param options:     Extra PatternedPDF arguments for every case, e.g. backend='direct'
+    :return:            Results dict as written to the output file
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        make_pdf(folder, matrix[0], **options).create_patterned_pdf().save()       # warm up imports
+        for n, case in enumerate(matrix, 1):
+            result = measure(folder, case, repeat, **options)
+            results.append(result)
+            if progress:
+                print(f"[{n}/{len(matrix)}] {result['id']:<32}{result['time_s'] * 1000:>9.1f} ms"
+                      f"{result['peak_bytes'] / 1e6:>9.2f} MB{result['bytes']:>10} B{result['operators']:>8} ops",
+                      file=sys.stderr)
+    return dict(version=RESULTS_VERSION, environment=environment(), repeat=repeat, options=options, results=results)
+
+
+def compare(before, after, time_threshold=0.10, memory_threshold=0.10, min_time=0.001):
+    """
+    Compare two result files case by case.
+
+    Output size and operator counts are deterministic, so any increase is a regression. Wall time and
+    peak memory are flagged when they grow by more than their threshold, and time only above min_time
+    seconds of difference, to stay clear of timer noise.
+
+    :return:    (rows, regressions): rows of (case id, metric, before, after, ratio, flag) for every
+                changed metric, and the number of regressions
+    """
+    old = {result['id']: result for result in before['results']}
+    new = {result['id']: result for result in after['results']}
+    rows = []
+    regressions = 0
+    for case in [case for case in new if case in old]:
+        a, b = old[case], new[case]
+        for metric, threshold, floor in (('time_s', time_threshold, min_time), ('peak_bytes', memory_threshold, 0),
+                                         ('bytes', 0, 0), ('operators', 0, 0)):
+            if a[metric] == b[metric]:
+                continue
+            ratio = b[metric] / a[metric] if a[metric] else float('inf')
+            if ratio > 1 + threshold and b[metric] - a[metric] > floor:
+                flag = 'REGRESSION'
+                regressions += 1
+            elif ratio < 1 / (1 + threshold) and a[metric] - b[metric] > floor:
+                flag = 'improved'
+            else:
+                continue
+            rows.append((case, metric, a[metric], b[metric], ratio, flag))
+    rows += [(case, 'case', None, None, None, 'only in before') for case in old if case not in new]
+    rows += [(case, 'case', None, None, None, 'only in after') for case in new if case not in old]
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmark matrix and write the results as JSON')
+    run_parser.add_argument('--output', '-o', required=True, help='results file (JSON)')
+    run_parser.add_argument('--quick', action='store_true', help=f'reduced matrix: {QUICK}')
+    run_parser.add_argument('--patterns', nargs='+', choices=PATTERNS)
+    run_parser.add_argument('--papers', nargs='+', choices=list(PAPERS))
+    run_parser.add_argument('--grid-sizes', nargs='+', type=float)
+    run_parser.add_argument('--pages', nargs='+', type=int)
+    run_parser.add_argument('--no-table', action='store_true', help='only cases without table')
+    run_parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (default 3)')
+    run_parser.add_argument('--backend', choices=['reportlab', 'direct'], default='reportlab')
+    run_parser.add_argument('--render-mode', choices=['paths', 'tiling'], default='paths')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files and flag regressions')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--time-threshold', type=float, default=0.10, help='relative slowdown flagged (default 0.10)')
+    compare_parser.add_argument('--memory-threshold', type=float, default=0.10, help='relative memory growth flagged (default 0.10)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        defaults = dict(QUICK) if args.quick else {}
+        matrix = cases(patterns=args.patterns or PATTERNS,
+                       tables=[None] if args.no_table else TABLES,
+                       papers=args.papers or defaults.get('papers', list(PAPERS)),
+                       grid_sizes=args.grid_sizes or defaults.get('grid_sizes', GRID_SIZES),
+                       pages=args.pages or defaults.get('pages', PAGES))
+        results = run(matrix, args.repeat, backend=args.backend, render_mode=args.render_mode)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        total = sum(result['time_s'] for result in results['results'])
+        print(f"{len(matrix)} cases, {total:.2f} s median render time in total, written to {args.output}")
+        return 0
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    rows, regressions = compare(before, after, args.time_threshold, args.memory_threshold)
+    for case, metric, a, b, ratio, flag in rows:
+        if metric == 'case':
+            print(f'{case:<34}{flag}')
+        else:
+            print(f'{case:<34}{metric:<12}{a:>14.6g}{b:>14.6g}{ratio:>8.2f}x  {flag}')
+    print(f'{len({row[0] for row in rows})} case(s) changed, {regressions} regression(s)')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
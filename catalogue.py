@@ -0,0 +1,78 @@
+"""
+Catalogue bundles: every template of a sweep as one page of a single PDF.
+
+Templates of a sweep mostly differ in their overlay (title, summary and cue lines, table) while
+the background layer (page colour and grid, dotted or ruled pattern) repeats. The catalogue
+draws each distinct background once as a form XObject that every page using it references,
+draws the overlay on the page, and adds a bookmark per template named by its pdf_name, under
+one bookmark per output folder when the sweep has several.
+
+    python -m generate_templates sweeps/a4_7.5mm_white.json --catalogue catalogue.pdf
+"""
+import os
+
+from patternedPDF import PatternedPDF
+
+
+def folder_titles(folders):
+    """Bookmark titles of output folders: their path relative to the folder they all share."""
+    named = [folder for folder in folders if folder]
+    common = os.path.commonpath(named) if named else ''
+    titles = {}
+    for folder in folders:
+        title = os.path.relpath(folder, common) if folder else ''
+        titles[folder] = os.path.basename(common) or common if title in ('', '.') else title
+    return titles
+
+
+def render_catalogue(jobs, output, backend='reportlab', compress=True):
+    """
+    Render jobs as the pages of one catalogue PDF, sharing identical backgrounds.
+
+    Each job gives one page, whatever its pages argument.
+
+    :param jobs:        List of dicts of PatternedPDF keyword arguments, e.g. from expand_grid
+    :param output:      Path or binary file-like object to write the catalogue to
+    :param backend:     PDF writer of the catalogue ('reportlab' or 'direct'), used for every page
+    :param compress:    Flate-compress the content streams
+    :return:            Dict with the number of pages and of distinct backgrounds
+    """
+    templates = [PatternedPDF(**dict(job, backend=backend, compress=compress, pages=1)) for job in jobs]
+    if not templates:
+        raise ValueError('A catalogue needs at least one template')
+    if isinstance(output, (str, os.PathLike)) and os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    pdf = templates[0].create_canvas(output)
+
+    folders = [template.output_folder for template in templates]
+    titles = folder_titles(list(dict.fromkeys(folders)))
+    nested = len(titles) > 1
+    backgrounds = {}        # background_key() -> form name
+    for n, template in enumerate(templates):
+        pdf.setPageSize((template.paper_width, template.paper_height))
+
+        # Background layer, recorded as a form the first time it is needed
+        key = template.background_key()
+        if key not in backgrounds:
+            backgrounds[key] = template.unique_form_name(pdf, 'background')
+            pdf.beginForm(backgrounds[key])
+            template.draw_background(pdf)
+            template.end_form(pdf)
+        pdf.doForm(backgrounds[key])
+
+        # Overlay layer, drawn on the page itself
+        template.flip(pdf)
+        template.geometry = template.create_geometry()
+        template.draw_overlay(pdf)
+
+        # Bookmarks need a key of their own per outline entry
+        if nested and (n == 0 or folders[n] != folders[n - 1]):
+            pdf.bookmarkPage(f'folder{n}')
+            pdf.addOutlineEntry(titles[folders[n]], f'folder{n}', level=0)
+        pdf.bookmarkPage(f'page{n}')
+        pdf.addOutlineEntry(template.pdf_name, f'page{n}', level=1 if nested else 0)
+        pdf.showPage()
+
+    pdf.showOutline()
+    pdf.save()
+    return dict(pages=len(templates), backgrounds=len(backgrounds))
@@ -1,6 +1,9 @@
 import re
 import colorsys
-import numpy as np
+import functools
+from lazy_modules import lazy_import
+
+np = lazy_import('numpy')
 
 def detect_color_type(color):
     """Detect the color format based on the input."""
@@ -19,6 +22,8 @@ def detect_color_type(color):
 def parse_hsl_string(hsl_string):
     """Parse HSL string into a tuple of (h, s, l)."""
     hsl_values = re.findall(r'\d+', hsl_string)
+    if len(hsl_values) < 3:
+        raise ValueError(f"Unsupported HSL color: {hsl_string!r} (needs three numbers)")
     return int(hsl_values[0]), int(hsl_values[1]), int(hsl_values[2])
 
 def hex_to_rgb(hex_color):
@@ -96,6 +101,143 @@ def convert_color(color, to_format, alpha=1):
     
     raise ValueError(f"Unsupported target format: {to_format}")
 
+def hex_digits(hex_color):
+    """Return the 6 or 8 hex digits of a HEX colour, expanding the #rgb and #rgba shorthands."""
+    digits = hex_color.lstrip('#')
+    if len(digits) in (3, 4):
+        digits = ''.join(c * 2 for c in digits)
+    if len(digits) not in (6, 8):
+        raise ValueError(f"Unsupported HEX color: {hex_color}")
+    return digits
+
+def normalize_color(color, opacity=1):
+    """
+    Convert one colour to normalised float RGBA, memoized.
+
+    :param color:       HEX string ('#34a1eb', '#34a1eb80'), HSL string ('hsl(204, 82%, 56%)'),
+                        or RGB / RGBA sequence with channels and alpha in 0..255
+    :param opacity:     Alpha (0..1) used when the colour has no alpha of its own
+    :return:            np.array([r, g, b, a]) in 0..1, identical to the matching row of normalize_colors
+    """
+    if isinstance(color, np.ndarray):
+        color = tuple(color.tolist())
+    elif isinstance(color, list):
+        color = tuple(color)
+    return np.array(normalized_rgba(color, float(opacity)))
+
+@functools.lru_cache(maxsize=4096)
+def normalized_rgba(color, opacity):
+    """Memoized scalar path of normalize_color; takes a hashable colour and returns a tuple."""
+    color_type = detect_color_type(color)
+    if color_type == 'hex':
+        channels = tuple(bytes.fromhex(hex_digits(color)))
+    elif color_type == 'hsl':
+        channels = hsl_to_rgb(parse_hsl_string(color))
+    elif color_type in ('rgb', 'rgba'):
+        channels = color
+    else:
+        raise ValueError(f"Unsupported color format: {color!r}")
+
+    r, g, b = (float(c) / 255 for c in channels[:3])
+    alpha = float(channels[3]) / 255 if len(channels) == 4 else opacity
+    return r, g, b, alpha
+
+def normalize_colors(colors, opacity=1):
+    """
+    Convert many colours to normalised float RGBA in one vectorized pass.
+
+    :param colors:      Sequence of colours in any mix of the formats accepted by normalize_color,
+                        or a numeric array of shape (N, 3) or (N, 4)
+    :param opacity:     Alpha (0..1) for colours without alpha of their own; a scalar or one value per colour
+    :return:            Float array of shape (N, 4) in 0..1
+    """
+    if isinstance(colors, np.ndarray) and colors.dtype.kind in 'iuf':
+        colors = colors.reshape(-1, colors.shape[-1]) if colors.size else colors.reshape(0, 3)
+        return rgba_rows(colors, np.broadcast_to(np.asarray(opacity, dtype=float), len(colors)))
+
+    colors = list(colors)
+    opacity = np.broadcast_to(np.asarray(opacity, dtype=float), len(colors))
+    out = np.empty((len(colors), 4))
+
+    # Split the colours into strings and sequences, then convert each format as a whole
+    is_string = np.array([isinstance(color, str) for color in colors], dtype=bool)
+    strings, sequences = np.flatnonzero(is_string), np.flatnonzero(~is_string)
+
+    if len(strings):
+        text = np.array([colors[i] for i in strings])
+        is_hex = np.char.startswith(text, '#')
+        is_hsl = ~is_hex & (np.char.find(text, 'hsl') >= 0)
+        if not (is_hex | is_hsl).all():
+            raise ValueError(f"Unsupported color format: {text[~(is_hex | is_hsl)][0]!r}")
+        out[strings[is_hex]] = hex_rows(text[is_hex], opacity[strings[is_hex]])
+        out[strings[is_hsl]] = rgba_rows(hsl_to_rgb_array(parse_hsl_strings(text[is_hsl])), opacity[strings[is_hsl]])
+
+    if len(sequences):
+        lengths = np.array([len(colors[i]) if isinstance(colors[i], (list, tuple, np.ndarray)) else 0
+                            for i in sequences])
+        if not np.isin(lengths, (3, 4)).all():
+            raise ValueError(f"Unsupported color format: {colors[sequences[~np.isin(lengths, (3, 4))][0]]!r}")
+        for length in (3, 4):
+            index = sequences[lengths == length]
+            if len(index):
+                out[index] = rgba_rows(np.array([colors[i] for i in index], dtype=float), opacity[index])
+    return out
+
+def hex_rows(text, opacity):
+    """Vectorized HEX parsing: array of HEX strings to normalised RGBA rows."""
+    digits = np.char.lstrip(text, '#').astype('U8')
+    lengths = np.char.str_len(digits)
+    shorthand = np.isin(lengths, (3, 4))
+    if shorthand.any():
+        digits[shorthand] = [hex_digits(d) for d in digits[shorthand].tolist()]
+        lengths = np.char.str_len(digits)
+    if not np.isin(lengths, (6, 8)).all():
+        raise ValueError(f"Unsupported HEX color: {text[~np.isin(lengths, (6, 8))][0]}")
+
+    out = np.empty((len(text), 4))
+    for length in (6, 8):
+        group = lengths == length
+        if group.any():
+            rows = np.frombuffer(bytes.fromhex(''.join(digits[group].tolist())), dtype=np.uint8).reshape(-1, length // 2)
+            out[group] = rgba_rows(rows, opacity[group])
+    return out
+
+def parse_hsl_strings(text):
+    """Vectorized parse_hsl_string: array of HSL strings to an (N, 3) float array of (h, s, l)."""
+    # One string per line; newlines inside a string are separators like any other non-digit
+    strings = [string.replace('\n', ' ') for string in text.tolist()]
+    values = re.findall(r'^[^\d\n]*(\d+)[^\d\n]+(\d+)[^\d\n]+(\d+)', '\n'.join(strings), re.M)
+    if len(values) != len(text):
+        for string in text.tolist():
+            parse_hsl_string(string)        # raises for the first string without three numbers
+    return np.array(values, dtype=float).reshape(-1, 3)
+
+def rgba_rows(rows, opacity):
+    """Normalise an (N, 3) or (N, 4) array of 0..255 channels; rows without alpha take `opacity`."""
+    rows = np.asarray(rows, dtype=float)
+    if rows.ndim != 2 or rows.shape[1] not in (3, 4):
+        raise ValueError(f"Unsupported color array shape: {rows.shape}")
+    out = np.empty((len(rows), 4))
+    out[:, :3] = rows[:, :3] / 255
+    out[:, 3] = rows[:, 3] / 255 if rows.shape[1] == 4 else opacity
+    return out
+
+def hsl_to_rgb_array(hsl):
+    """Vectorized hsl_to_rgb: (N, 3) array of H (degrees), S and L (percent) to truncated 0..255 RGB."""
+    h, s, l = hsl[:, 0] / 360, hsl[:, 1] / 100, hsl[:, 2] / 100
+
+    # Same arithmetic as colorsys.hls_to_rgb, so the result matches the scalar path exactly
+    m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+    channels = []
+    for hue in (h + 1.0 / 3.0, h, h - 1.0 / 3.0):
+        hue = hue % 1.0
+        channel = np.where(hue < 1.0 / 6.0, m1 + (m2 - m1) * hue * 6.0,
+                  np.where(hue < 0.5, m2,
+                  np.where(hue < 2.0 / 3.0, m1 + (m2 - m1) * (2.0 / 3.0 - hue) * 6.0, m1)))
+        channels.append(np.where(s == 0.0, l, channel))
+    return np.trunc(np.stack(channels, axis=1) * 255)
+
 
 
 
@@ -109,4 +251,8 @@ if __name__ == "__main__":
     print(convert_color("#34a1eb1b", "rgba"))           # HEX to RGBA
     print(convert_color((52, 161, 235, 100), "hex"))    # RGBA to HEX
     print(convert_color("#34a1ebff", "rgba"))           # HEX with alpha to RGBA
-    print(convert_color((52, 161, 235, 0.5), "rgba"))   # RGBA input, ignore default alpha
\ No newline at end of file
+    print(convert_color((52, 161, 235, 0.5), "rgba"))   # RGBA input, ignore default alpha
+
+    # Normalised float RGBA, one colour or many at once
+    print(normalize_color("#34a1eb", opacity=0.8))                                  # [0.2039 0.6314 0.9216 0.8]
+    print(normalize_colors(["#34a1eb80", (52, 161, 235), "hsl(204, 82%, 56%)"], 0.5))
\ No newline at end of file
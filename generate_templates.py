@@ -0,0 +1,247 @@
+"""
+Generate PatternedPDF templates from a sweep specification.
+
+    python -m generate_templates sweeps/a4_7.5mm_white.json
+    python -m generate_templates sweeps/a4_7.5mm_white.json --workers 4 --no-cache
+    python -m generate_templates sweeps/a4_7.5mm_white.json --backend direct
+    python -m generate_templates sweeps/a4_7.5mm_white.json --zip templates.zip
+    python -m generate_templates sweeps/a4_7.5mm_white.json --zip - > templates.zip
+    python -m generate_templates sweeps/a4_7.5mm_white.json --catalogue catalogue.pdf
+    python -m generate_templates sweeps/a4_7.5mm_white.json --impose imposed.pdf --layout 4 --sheet A3
+    python -m generate_templates sweeps/a4_7.5mm_white.json --impose booklet.pdf --layout booklet --signature 16 --creep 0.1
+    python -m generate_templates sweeps/a4_7.5mm_white.json --previews previews --dpi 36
+    python -m generate_templates sweeps/a4_7.5mm_white.json --reproducible
+    python -m generate_templates sweeps/a4_7.5mm_white.json --watch
+    python -m generate_templates sweeps/a4_7.5mm_white.json --dry-run
+    python -m generate_templates sweeps/a4_7.5mm_white.json --phases phases.jsonl --profile profiles
+
+A specification is a JSON file:
+
+    {
+      "output_folder": "templates/A4 7.5mm white - P",
+      "cache": {"path": "templates/.render_cache", "max_entries": 2000},      (optional)
+      "base": {PatternedPDF arguments shared by every sweep},
+      "sweeps": [
+        {
+          "name": "pdf_name format string, e.g. {pattern} - {title_perc}",
+          "grid": {argument: [values to sweep], ...},
+          "subfolder": "cornell",                                               (optional)
+          "base": {argument overrides for this sweep},                          (optional)
+          "require_different": ["cue_perc_left", "cue_perc_right"]              (optional)
+        }
+      ]
+    }
+
+Colours are given as {"color": <hex, hsl or RGB(A) list>, "opacity": 0..1}; the opacity is used
+when the colour has no alpha of its own. NumPy and reportlab are only imported once rendering starts.
+"""
+import sys
+import json
+import argparse
+
+COLOR_ARGUMENTS = ('grid_color', 'line_color', 'bg_color', 'table_color')
+ARRAY_ARGUMENTS = ('margin',)
+
+
+def resolve_arguments(arguments):
+    """Turn the JSON form of PatternedPDF arguments into the values the class expects."""
+    import numpy as np
+    import convert_color
+
+    resolved = dict(arguments)
+    for name in COLOR_ARGUMENTS:
+        if isinstance(resolved.get(name), dict):
+            resolved[name] = convert_color.normalize_color(resolved[name]['color'], resolved[name].get('opacity', 1))
+    for name in ARRAY_ARGUMENTS:
+        if name in resolved:
+            resolved[name] = np.array(resolved[name])
+    return resolved
+
+
+def load_jobs(spec, resolve=True):
+    """
+    Expand a sweep specification into PatternedPDF jobs.
+
+    :param spec:        Parsed specification (see the module docstring)
+    :param resolve:     Convert colours and margins; without it only names and folders are meaningful
+    :return:            List of dicts of PatternedPDF keyword arguments
+    """
+    from sweep import expand_grid
+
+    convert = resolve_arguments if resolve else dict
+    base = convert(spec.get('base', {}))
+    jobs = []
+    for entry in spec['sweeps']:
+        folder = spec['output_folder']
+        if entry.get('subfolder'):
+            folder = f"{folder}/{entry['subfolder']}"
+        entry_base = dict(base, **convert(entry.get('base', {})), output_folder=folder)
+
+        different = entry.get('require_different')
+        where = (lambda job, keys=tuple(different): len({job[key] for key in keys}) == len(keys)) if different else None
+        jobs += expand_grid(entry['grid'], entry_base, entry['name'], where)
+    return jobs
+
+
+def apply_options(jobs, args):
+    # Command line settings that override those of the specification
+    if args.backend:
+        jobs = [dict(job, backend=args.backend) for job in jobs]
+    if args.reproducible:
+        jobs = [dict(job, reproducible=True) for job in jobs]
+    return jobs
+
+
+def write_zip(spec, args):
+    # Render the templates in memory and stream them into one archive; the render cache is not used
+    import os
+    from sweep import stream_zip, fixed_date_time
+
+    jobs = apply_options(load_jobs(spec), args)
+    out = sys.stdout.buffer if args.zip == '-' else open(args.zip, 'wb')
+    size = 0
+    try:
+        for chunk in stream_zip(jobs, workers=args.workers or os.cpu_count() or 1, chunksize=args.chunksize or 1,
+                                date_time=fixed_date_time() if args.reproducible else None):
+            out.write(chunk)
+            size += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f'{len(jobs)} templates, {size} bytes written to {"stdout" if args.zip == "-" else args.zip}', file=sys.stderr)
+    return 0
+
+
+def write_catalogue(spec, args):
+    # Render every template as a page of one PDF with bookmarks; the render cache is not used
+    import os
+    from catalogue import render_catalogue
+
+    jobs = apply_options(load_jobs(spec), args)
+    backend = args.backend or jobs[0].get('backend', 'reportlab')
+    result = render_catalogue(jobs, args.catalogue, backend=backend)
+    print(f"{result['pages']} templates on one page each, sharing {result['backgrounds']} backgrounds, "
+          f"{os.path.getsize(args.catalogue)} bytes written to {args.catalogue}", file=sys.stderr)
+    return 0
+
+
+def write_imposition(spec, args):
+    # Impose every template's pages onto sheets in one PDF; the render cache is not used
+    import os
+    from imposition import impose, parse_sheet
+
+    jobs = apply_options(load_jobs(spec), args)
+    backend = args.backend or jobs[0].get('backend', 'reportlab')
+    layout = args.layout if args.layout == 'booklet' else int(args.layout)
+    result = impose(jobs, args.impose, layout, parse_sheet(args.sheet) if args.sheet else None,
+                    args.signature, args.creep, backend=backend)
+    print(f"{result['pages']} pages ({result['forms']} distinct) imposed on {result['sheets']} sheets, "
+          f"{os.path.getsize(args.impose)} bytes written to {args.impose}", file=sys.stderr)
+    return 0
+
+
+def write_preview_pngs(spec, args):
+    # Rasterize every template into a PNG thumbnail with NumPy; no PDF is rendered
+    from preview import write_previews
+
+    jobs = load_jobs(spec)
+    result = write_previews(jobs, args.previews, dpi=args.dpi, workers=args.workers, chunksize=args.chunksize)
+    print(f"{result['previews']} previews ({result['rendered']} distinct) written to {args.previews}", file=sys.stderr)
+    return 0
+
+
+def watch_spec(args):
+    # Keep the templates up to date while the specification is edited, until interrupted
+    from watch import Watcher
+
+    with Watcher(args.spec, workers=args.workers, prepare=lambda jobs: apply_options(jobs, args),
+                 use_cache=not args.no_cache, dedupe=not args.no_dedupe) as watcher:
+        print(f'watching {args.spec} with {watcher.workers} workers (Ctrl+C to stop)', file=sys.stderr)
+        watcher.run(interval=args.interval)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m generate_templates',
+                                     description='Generate PatternedPDF templates from a sweep specification.')
+    parser.add_argument('spec', help='sweep specification (JSON)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunksize', type=int, help='jobs sent to a worker at a time')
+    parser.add_argument('--no-cache', action='store_true', help="ignore the specification's render cache")
+    parser.add_argument('--no-dedupe', action='store_true', help='render templates with the same layout separately')
+    parser.add_argument('--backend', choices=['reportlab', 'direct'], help="PDF writer, overriding the specification's")
+    parser.add_argument('--reproducible', action='store_true',
+                        help='byte-identical PDFs for identical inputs (fixed date and ID, see SOURCE_DATE_EPOCH)')
+    parser.add_argument('--zip', metavar='PATH',
+                        help="stream every template into one ZIP archive ('-' for stdout) instead of writing files")
+    parser.add_argument('--catalogue', metavar='PATH',
+                        help='write every template as a bookmarked page of one PDF, sharing identical backgrounds')
+    parser.add_argument('--impose', metavar='PATH', help='impose the pages of every template onto sheets in one PDF')
+    parser.add_argument('--layout', choices=['2', '4', '8', 'booklet'], default='2',
+                        help='with --impose, pages per sheet or saddle-stitched booklet (default 2)')
+    parser.add_argument('--sheet', help='with --impose, sheet size: A0..A6 or WIDTHxHEIGHT in mm (default: fits the pages)')
+    parser.add_argument('--signature', type=int, help='with --layout booklet, pages per signature (a multiple of 4)')
+    parser.add_argument('--creep', type=float, default=0, help='with --layout booklet, creep in mm per sheet')
+    parser.add_argument('--previews', metavar='FOLDER', help='write a PNG preview of every template instead of its PDF')
+    parser.add_argument('--dpi', type=float, default=36, help='with --previews, resolution in pixels per inch (default 36)')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running: on every change to the specification render only new and changed templates '
+                             'and delete those it no longer produces')
+    parser.add_argument('--interval', type=float, default=0.2,
+                        help='with --watch, seconds between checks of the specification (default 0.2)')
+    parser.add_argument('--dry-run', action='store_true', help='list the templates without rendering them')
+    parser.add_argument('--phases', metavar='PATH',
+                        help='append time, operators, allocations and size of every rendering phase to a JSON lines file')
+    parser.add_argument('--memory', action='store_true', help='with --phases, also trace allocations (slower)')
+    parser.add_argument('--profile', metavar='FOLDER', help='dump cProfile statistics of the pattern and save phases')
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        return watch_spec(args)
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+
+    if args.dry_run:
+        jobs = load_jobs(spec, resolve=False)
+        for job in jobs:
+            print(f"{job['output_folder']}/{job['pdf_name']}.pdf")
+        print(f'{len(jobs)} templates')
+        return 0
+
+    if args.zip:
+        return write_zip(spec, args)
+    if args.catalogue:
+        return write_catalogue(spec, args)
+    if args.impose:
+        return write_imposition(spec, args)
+    if args.previews:
+        return write_preview_pngs(spec, args)
+
+    from sweep import run_sweep
+    from render_cache import RenderCache
+
+    cache = None
+    if spec.get('cache') and not args.no_cache:
+        cache = RenderCache(spec['cache']['path'], spec['cache'].get('max_entries'), spec['cache'].get('max_bytes'))
+
+    jobs = apply_options(load_jobs(spec), args)
+    if args.phases or args.profile:
+        import instrumentation
+        if args.phases:
+            open(args.phases, 'w').close()          # the summary covers this run only
+        sinks = ([instrumentation.JsonLinesSink(args.phases)] if args.phases else []) + \
+                ([instrumentation.ProfileSink(args.profile)] if args.profile else [])
+        instrument = instrumentation.Instrumentation(*sinks, memory=args.memory)
+        jobs = [dict(job, instrument=instrument) for job in jobs]
+    result = run_sweep(jobs, workers=args.workers, chunksize=args.chunksize, cache=cache, dedupe=not args.no_dedupe)
+    for job, error in result.failures:
+        print(f"failed: {job['output_folder']}/{job['pdf_name']}\n{error}", file=sys.stderr)
+    print(result)
+    if args.phases:
+        instrumentation.main(['summary', args.phases])
+    return 1 if result.failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Print imposition: rendered template pages placed N-up or as booklet signatures on larger sheets.
+
+The pages of the jobs, in order and each job repeated `pages` times, are imposed onto sheets:
+
+    n-up        n pages per sheet (2, 4, 8, ...) in reading order, rows from the top
+    booklet     saddle-stitched signatures: every sheet carries four pages, two on the front and
+                two on the back, ordered so that the folded and nested sheets read 1, 2, 3, ...
+                Printed duplex, the sheet turning over on its short edge
+
+Every distinct page is drawn once as a form XObject, and each place on a sheet references it
+through a scale (and rotation) matrix, so imposing a 200-page booklet of one template costs
+little more than writing its 50 sheets. Pages are rotated by 90 degrees where that makes them
+fit larger, and are never enlarged, so grid sizes stay true on paper. Booklets can be split
+into signatures of a given number of pages, and creep moves the pages of the inner sheets of a
+signature towards the fold to make up for the paper they wrap around.
+
+    python -m generate_templates sweeps/a4_7.5mm_white.json --impose imposed.pdf --layout 4 --sheet A3
+"""
+import os
+
+from patternedPDF import PatternedPDF, mm
+from page_geometry import PAPERS
+
+
+def parse_sheet(text):
+    """Sheet size in mm from an A-series name ('A3') or 'WIDTHxHEIGHT' in mm."""
+    if text.upper() in PAPERS:
+        return PAPERS[text.upper()]
+    try:
+        width, height = (float(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Unsupported sheet: {text} (use one of {', '.join(PAPERS)} or WIDTHxHEIGHT in mm)")
+    return width, height
+
+
+def fit(page, cell):
+    """
+    Scale and rotation that fit a page into a cell, without enlarging it.
+
+    :param page:    (width, height) of the page
+    :param cell:    (width, height) of the cell
+    :return:        (scale, rotated); rotated pages are turned by 90 degrees anticlockwise
+    """
+    straight = min(cell[0] / page[0], cell[1] / page[1], 1)
+    rotated = min(cell[0] / page[1], cell[1] / page[0], 1)
+    return (rotated, True) if rotated > straight else (straight, False)
+
+
+def nup_grid(page, sheet, n):
+    """
+    Columns and rows of an n-up sheet: the grid of n cells the page fits largest in.
+
+    :param page:    (width, height) of the page
+    :param sheet:   (width, height) of the sheet, or None for the smallest sheet holding n unscaled pages
+    :param n:       Pages per sheet
+    :return:        (columns, rows, sheet)
+    """
+    grids = [(columns, n // columns) for columns in range(1, n + 1) if n % columns == 0]
+    if sheet is None:
+        # Closest to square, wider than tall
+        columns, rows = min(grids, key=lambda grid: (abs(grid[0] - grid[1]), -grid[0]))
+        return columns, rows, (columns * page[0], rows * page[1])
+    columns, rows = max(grids, key=lambda grid: fit(page, (sheet[0] / grid[0], sheet[1] / grid[1]))[0])
+    return columns, rows, sheet
+
+
+def booklet_sheets(count):
+    """
+    Page order of one saddle-stitched signature.
+
+    :param count:   Number of pages, a multiple of 4
+    :return:        List of sheets from the outside in, each ((front left, front right), (back left, back right))
+                    as 0-based page indices
+    """
+    return [((count - 1 - 2 * n, 2 * n), (2 * n + 1, count - 2 - 2 * n)) for n in range(count // 4)]
+
+
+def place(pdf, template, form, cell, scale, rotated, shift=0):
+    # Draw a page form centred in cell (x, y, width, height), shifted horizontally by `shift`
+    # and clipped to the cell
+    x, y, width, height = cell
+    page_width, page_height = template.paper_width * scale, template.paper_height * scale
+    if rotated:
+        page_width, page_height = page_height, page_width
+    left = x + (width - page_width) / 2 + shift
+    bottom = y + (height - page_height) / 2
+    pdf.saveState()
+    pdf.addLiteral(f'{template.fp_str(x, y, width, height)} re W n')
+    if rotated:
+        pdf.transform(0, scale, -scale, 0, left + page_width, bottom)
+    else:
+        pdf.transform(scale, 0, 0, scale, left, bottom)
+    pdf.doForm(form)
+    pdf.restoreState()
+
+
+def impose(jobs, output, layout=2, sheet=None, signature=None, creep=0, backend='reportlab', compress=True):
+    """
+    Impose the pages of jobs onto sheets in one PDF.
+
+    :param jobs:        List of dicts of PatternedPDF keyword arguments; each job gives `pages` pages
+    :param output:      Path or binary file-like object to write the imposed PDF to
+    :param layout:      Pages per sheet for n-up (e.g. 2 or 4), or 'booklet'
+    :param sheet:       (width, height) of the sheets in mm; by default just large enough for unscaled pages.
+                        Booklet sheets are used in landscape
+    :param signature:   Booklet pages per signature, a multiple of 4; by default one signature for all pages
+    :param creep:       Booklet creep in mm per sheet: the pages of the n-th sheet from the outside of
+                        a signature move n * creep towards the fold
+    :param backend:     PDF writer ('reportlab' or 'direct')
+    :param compress:    Flate-compress the content streams
+    :return:            Dict with the number of pages, sheets, sheet sides and distinct page forms
+    """
+    if layout != 'booklet' and not (isinstance(layout, int) and layout > 0):
+        raise ValueError(f'Unsupported layout: {layout}')
+    if signature is not None and (signature <= 0 or signature % 4):
+        raise ValueError(f'Unsupported signature: {signature} pages (use a multiple of 4)')
+    templates = [PatternedPDF(**dict(job, backend=backend, compress=compress)) for job in jobs]
+    if not templates:
+        raise ValueError('Imposition needs at least one template')
+    if isinstance(output, (str, os.PathLike)) and os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    pdf = templates[0].create_canvas(output)
+
+    # Every distinct page drawn once, as a form the size of the page
+    forms = {}              # background_key() + overlay_key() -> form name
+    pages = []              # (template, form name) of every page, in order
+    for template in templates:
+        key = template.background_key() + template.overlay_key()
+        if key not in forms:
+            forms[key] = template.unique_form_name(pdf, 'page')
+            pdf.beginForm(forms[key], 0, 0, template.paper_width, template.paper_height)
+            template.draw_page(pdf)
+            template.end_form(pdf)
+        pages += [(template, forms[key])] * template.pages
+    first = templates[0]
+    page_size = (first.paper_width, first.paper_height)
+
+    # Sheet sides as lists of (page index or None, cell, shift)
+    sides = []
+    if layout == 'booklet':
+        if sheet is None:
+            sheet_size = (2 * page_size[0], page_size[1])
+        else:
+            sheet_size = (max(sheet) * mm, min(sheet) * mm)
+        cells = [(0, 0, sheet_size[0] / 2, sheet_size[1]), (sheet_size[0] / 2, 0, sheet_size[0] / 2, sheet_size[1])]
+        count = -(-len(pages) // 4) * 4
+        size = signature or count
+        for start in range(0, count, size):
+            for n, both_sides in enumerate(booklet_sheets(min(size, count - start))):
+                # Inner sheets move towards the fold: the left page right, the right page left
+                shift = n * creep * mm
+                for left, right in both_sides:
+                    sides.append([(start + left, cells[0], shift), (start + right, cells[1], -shift)])
+        sheets = len(sides) // 2
+    else:
+        columns, rows, sheet_size = nup_grid(page_size, None if sheet is None else (sheet[0] * mm, sheet[1] * mm), layout)
+        width, height = sheet_size[0] / columns, sheet_size[1] / rows
+        cells = [(column * width, sheet_size[1] - (row + 1) * height, width, height)
+                 for row in range(rows) for column in range(columns)]
+        for start in range(0, len(pages), layout):
+            sides.append([(start + n, cell, 0) for n, cell in enumerate(cells)])
+        sheets = len(sides)
+
+    for side in sides:
+        pdf.setPageSize(sheet_size)
+        for index, cell, shift in side:
+            if index < len(pages):
+                template, form = pages[index]
+                scale, rotated = fit((template.paper_width, template.paper_height), cell[2:])
+                place(pdf, template, form, cell, scale, rotated, shift)
+        pdf.showPage()
+    pdf.save()
+    return dict(pages=len(pages), sheets=sheets, sides=len(sides), forms=len(forms))
@@ -0,0 +1,227 @@
+"""
+Per-phase instrumentation of PatternedPDF rendering.
+
+Pass an Instrumentation to PatternedPDF(..., instrument=...) to record, for every template and
+phase (canvas, background, geometry, pattern, lines, table, pages, save, serialize), the wall
+time, the number of content-stream operators written, the bytes allocated (with memory=True)
+and the output size. Records go to one or more sinks:
+
+    JsonLinesSink(path)         one JSON object per line, appended (safe to share between worker processes)
+    MemorySink()                keeps the records in a list
+    ProfileSink(folder)         a cProfile dump per template and phase, for the phases asked for
+
+Without an Instrumentation, PatternedPDF uses a shared no-op context for every phase.
+
+    python -m generate_templates sweeps/a4_7.5mm_white.json --phases phases.jsonl --profile profiles
+    python -m instrumentation summary phases.jsonl          # time, operators, allocations and bytes per phase
+"""
+import os
+import re
+import sys
+import json
+import time
+import contextlib
+
+PHASES = ('canvas', 'background', 'geometry', 'pattern', 'lines', 'table', 'pages', 'save', 'serialize')
+OPERATOR_RE = re.compile(r"(?<!\S)[A-Za-z'\"][A-Za-z0-9*'\"]*(?!\S)")
+
+NO_PHASE = contextlib.nullcontext()
+
+
+def content_code(pdf):
+    """The list of content-stream fragments the canvas is currently writing to (either backend)."""
+    return pdf.code if hasattr(pdf, 'code') else pdf._code
+
+
+def count_operators(fragments):
+    """Count the content-stream operators in a list of code fragments."""
+    return sum(len(OPERATOR_RE.findall(fragment)) for fragment in fragments)
+
+
+class Sink:
+    """Receiver of phase records; subclasses override what they need."""
+
+    def phase_started(self, template, phase):
+        pass
+
+    def phase_finished(self, record):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemorySink(Sink):
+    def __init__(self):
+        """Keep every record in self.records (records from worker processes are not collected)."""
+        self.records = []
+
+    def phase_finished(self, record):
+        self.records.append(record)
+
+
+class JsonLinesSink(Sink):
+    def __init__(self, path):
+        """
+        Append every record to a JSON lines file.
+
+        :param path:    Output file; opened on the first record in each process, so the sink can be
+                        passed to worker processes
+        """
+        self.path = path
+        self.file = None
+
+    def phase_finished(self, record):
+        if self.file is None:
+            self.file = open(self.path, 'a')
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __getstate__(self):
+        return dict(self.__dict__, file=None)
+
+
+class ProfileSink(Sink):
+    def __init__(self, folder, phases=('pattern', 'save')):
+        """
+        Run the given phases under cProfile and dump one profile per template and phase.
+
+        :param folder:  Folder of the dumps, '<folder>/<template> - <phase>.prof' (read them with pstats or snakeviz)
+        :param phases:  Phases to profile, or None for all of them
+        """
+        self.folder = folder
+        self.phases = phases
+        self.profiler = None
+
+    def phase_started(self, template, phase):
+        import cProfile
+
+        if self.phases is None or phase in self.phases:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def phase_finished(self, record):
+        if self.profiler is None:
+            return
+        self.profiler.disable()
+        path = os.path.join(self.folder, f"{record['template'].lstrip('/')} - {record['phase']}.prof")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.profiler.dump_stats(path)
+        self.profiler = None
+
+
+class Instrumentation:
+    def __init__(self, *sinks, memory=False):
+        """
+        Record the phases of PatternedPDF rendering into sinks.
+
+        :param sinks:   Sink objects receiving the records
+        :param memory:  Also record the bytes allocated in each phase (peak, with tracemalloc; slows rendering)
+        """
+        self.sinks = sinks
+        self.memory = memory
+
+    @contextlib.contextmanager
+    def phase(self, template, name, pdf=None):
+        """
+        Time one phase of a template. The record is yielded so that the caller can add the output size.
+
+        :param template:    Template name (output_folder/pdf_name)
+        :param name:        Phase name, one of PHASES
+        :param pdf:         Canvas whose content-stream operators are counted, or None
+        """
+        record = dict(template=template, phase=name, time_s=None, operators=None, alloc_bytes=None, bytes=None)
+        for sink in self.sinks:
+            sink.phase_started(template, name)
+        if self.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        code = content_code(pdf) if pdf is not None else None
+        start_length = len(code) if code is not None else 0
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['time_s'] = time.perf_counter() - start
+            if code is not None:
+                # Operators added to the content stream the phase started in; forms drawn
+                # during the phase count as their Do operator
+                record['operators'] = count_operators(code[start_length:])
+            if self.memory:
+                record['alloc_bytes'] = tracemalloc.get_traced_memory()[1] - allocated
+            for sink in self.sinks:
+                sink.phase_finished(record)
+
+    def wrap_output(self, template, name, function, output=None):
+        """
+        Instrument a canvas output method (save or getpdfdata) as a phase that records the output size.
+
+        :param output:  Path or file-like object save() writes to; for getpdfdata the result is measured
+        """
+        def wrapper(*args, **kwargs):
+            with self.phase(template, name) as record:
+                result = function(*args, **kwargs)
+                record['bytes'] = output_size(result if output is None else output)
+            return result
+        return wrapper
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def output_size(output):
+    """Size of rendered output: bytes, a file path or a seekable file-like object; None if unknown."""
+    if isinstance(output, (bytes, bytearray)):
+        return len(output)
+    if isinstance(output, (str, os.PathLike)):
+        return os.path.getsize(output)
+    try:
+        return output.tell()
+    except (AttributeError, OSError):
+        return None
+
+
+def summarize(records):
+    """Totals per phase: {phase: {'count', 'time_s', 'operators', 'alloc_bytes', 'bytes'}} in PHASES order."""
+    totals = {}
+    for record in records:
+        total = totals.setdefault(record['phase'], dict(count=0, time_s=0.0, operators=0, alloc_bytes=0, bytes=0))
+        total['count'] += 1
+        for key in ('time_s', 'operators', 'alloc_bytes', 'bytes'):
+            total[key] += record.get(key) or 0
+    order = {phase: n for n, phase in enumerate(PHASES)}
+    return dict(sorted(totals.items(), key=lambda item: order.get(item[0], len(order))))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m instrumentation', description='Summarize recorded rendering phases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    summary_parser = commands.add_parser('summary', help='totals per phase of a JSON lines file')
+    summary_parser.add_argument('path')
+    args = parser.parse_args(argv)
+
+    with open(args.path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    totals = summarize(records)
+    elapsed = sum(total['time_s'] for total in totals.values()) or 1
+    print(f'{"phase":<12}{"count":>8}{"time (s)":>12}{"share":>8}{"operators":>12}{"allocated":>14}{"bytes":>14}')
+    for phase, total in totals.items():
+        print(f"{phase:<12}{total['count']:>8}{total['time_s']:>12.4f}{total['time_s'] / elapsed:>8.1%}"
+              f"{total['operators']:>12}{total['alloc_bytes']:>14}{total['bytes']:>14}")
+    print(f"{len({record['template'] for record in records})} templates")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,19 @@
+import sys
+import importlib.util
+
+
+def lazy_import(name):
+    """
+    Return module `name`, deferring its actual import until an attribute is first used.
+
+    Keeps importing this project cheap: NumPy and reportlab are only loaded once rendering starts.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
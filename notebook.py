@@ -0,0 +1,214 @@
+"""
+Long notebooks streamed page by page in constant memory.
+
+A notebook is a template (PatternedPDF arguments) and an iterable of page specs, for example
+a generator producing thousands of them. Each spec is a dict:
+
+    {'template': {PatternedPDF argument overrides, e.g. 'margin': [20, 10, 10, 10]},     (optional)
+     'text': [{'text': 'Page 12', 'x': 190, 'y': 287, 'size': 8, 'align': 'right',
+               'font': 'Helvetica', 'color': [0.4, 0.4, 0.4]}, ...]}                     (optional)
+
+Text positions are in mm from the top left corner of the page; align is 'left' (default),
+'right' or 'centre', and the font one of the 14 standard PDF fonts. Every distinct template
+variant is drawn once as a form XObject, and each page only draws that form and its text; only
+the most recently used variants are remembered, so a variant that comes back after many others
+is drawn again.
+Pages are written out as they are produced (pdf_writer.StreamingCanvas), so memory does not
+grow with the page count beyond a few bytes per page for the xref table.
+
+    python -m notebook --pages 10000 --output notebook.pdf      # numbered, dated pages with mirrored margins
+"""
+import os
+import sys
+import json
+import time
+import datetime
+
+from patternedPDF import PatternedPDF, mm
+
+ALIGNMENTS = ('left', 'right', 'centre')
+RECENT_VARIANTS = 64        # template variants whose forms are reused
+LABEL_MARGIN = (15, 16, 15, 14)     # margins in mm that numbered_pages places its labels by, without page margins
+
+
+def numbered_pages(count, first_date=None, margins=None, footer='{number}', paper=(210, 297)):
+    """
+    Page specs for a numbered notebook: a page number in the outer bottom corner, a date header
+    when first_date is given, and margins that alternate between right (odd) and left (even) pages.
+    The labels sit in the margins of the page, lined up with the outer edge of the pattern.
+
+    :param count:           Number of pages
+    :param first_date:      datetime.date of the first page, one day per page, or None
+    :param margins:         (right page margin, left page margin) in mm, each [left, top, right, bottom], or None
+    :param footer:          Format string of the page number, filled in with number and count
+    :param paper:           (width, height) of the pages in mm
+    :return:                Generator of page specs
+    """
+    width, height = paper
+    for number in range(1, count + 1):
+        right_page = number % 2 == 1
+        if margins is None:
+            left, top, right, bottom = LABEL_MARGIN
+        else:
+            left, top, right, bottom = margins[0] if right_page else margins[1]
+        spec = {'text': [dict(text=footer.format(number=number, count=count), x=width - right if right_page else left,
+                              y=height - bottom / 2, size=8, align='right' if right_page else 'left',
+                              color=[0.4, 0.4, 0.4])]}
+        if first_date is not None:
+            date = first_date + datetime.timedelta(days=number - 1)
+            spec['text'].append(dict(text=date.strftime('%A %d %B %Y'), x=width / 2, y=top / 2, size=10, align='centre'))
+        if margins is not None:
+            spec['template'] = {'margin': margins[0] if right_page else margins[1]}
+        yield spec
+
+
+class NotebookResult:
+    def __init__(self, pages, size, elapsed, variants):
+        """
+        Outcome of write_notebook.
+
+        :param pages:       Number of pages written
+        :param size:        Size of the PDF in bytes
+        :param elapsed:     Wall time in seconds
+        :param variants:    Number of template variants drawn as form XObjects (a variant that was forgotten
+                            and comes back is drawn again)
+        """
+        self.pages = pages
+        self.size = size
+        self.elapsed = elapsed
+        self.variants = variants
+
+    @property
+    def pages_per_second(self):
+        return self.pages / self.elapsed if self.elapsed else float('inf')
+
+    def __repr__(self):
+        return (f'NotebookResult({self.pages} pages, {self.variants} variants, {self.size} bytes in '
+                f'{self.elapsed:.2f} s, {self.pages_per_second:.0f} pages/s)')
+
+
+def iter_notebook(template, pages, chunk_size=65536, stats=None, recent_variants=RECENT_VARIANTS):
+    """
+    Render a notebook and yield the PDF in chunks while the pages are produced.
+
+    :param template:    Dict of PatternedPDF keyword arguments shared by every page (the direct backend is used)
+    :param pages:       Iterable of page specs (see the module docstring)
+    :param chunk_size:  Yield the output whenever at least this many bytes are pending
+    :param stats:       Optional dict that receives the number of pages and variants
+    :param recent_variants: How many of the most recently used template variants keep their form for reuse
+    :return:            Generator of bytes; the chunks joined are the PDF
+    """
+    from render_cache import canonical
+    from pdf_writer import StreamingCanvas, RecentDict
+    from generate_templates import resolve_arguments
+
+    template = dict(dict(output_folder=None, pdf_name='notebook'), **template, backend='direct', pages=1)
+    pdf = None
+    variants = RecentDict(recent_variants)      # canonical overrides -> (form name, page size), least recently used first
+    forms = 0
+    count = 0
+    for spec in pages:
+        overrides = spec.get('template', {})
+        key = json.dumps(canonical(overrides), sort_keys=True)
+        if key in variants:
+            variants.move_to_end(key)
+        else:
+            # Margins as lists and colours as {'color', 'opacity'} dicts, as in sweep specifications
+            patterned_pdf = PatternedPDF(**resolve_arguments(dict(template, **overrides)))
+            if pdf is None:
+                pdf = StreamingCanvas((patterned_pdf.paper_width, patterned_pdf.paper_height),
+                                      pageCompression=patterned_pdf.compress)
+            pdf.setPageSize((patterned_pdf.paper_width, patterned_pdf.paper_height))
+            name = f'page{forms}'
+            forms += 1
+            pdf.beginForm(name)
+            patterned_pdf.draw_page(pdf)
+            patterned_pdf.end_form(pdf)
+            variants[key] = (name, (patterned_pdf.paper_width, patterned_pdf.paper_height))
+        name, page_size = variants[key]
+
+        # The variant's page, then this page's text in unflipped page coordinates
+        pdf.setPageSize(page_size)
+        pdf.doForm(name)
+        for item in spec.get('text', ()):
+            align = item.get('align', 'left')
+            if align not in ALIGNMENTS:
+                raise ValueError(f'Unsupported alignment: {align}')
+            pdf.setFillColorRGB(*item.get('color', (0, 0, 0)))
+            pdf.setFont(item.get('font', 'Helvetica'), item.get('size', 9))
+            draw = {'left': pdf.drawString, 'right': pdf.drawRightString, 'centre': pdf.drawCentredString}[align]
+            draw(item['x'] * mm, page_size[1] - item['y'] * mm, str(item['text']))
+        pdf.showPage()
+        count += 1
+
+        if pdf.pending_size >= chunk_size:
+            yield pdf.drain()
+
+    if pdf is None:
+        raise ValueError('A notebook needs at least one page')
+    yield from pdf.finish()
+    if stats is not None:
+        stats.update(pages=count, variants=forms)
+
+
+def write_notebook(template, pages, output, chunk_size=65536):
+    """
+    Render a notebook to a path or binary file-like object, streaming the pages as they are produced.
+
+    :param template:    Dict of PatternedPDF keyword arguments shared by every page
+    :param pages:       Iterable of page specs (see the module docstring)
+    :param output:      Path or writable binary file-like object
+    :param chunk_size:  Bytes written at a time
+    :return:            NotebookResult with the page count and pages per second
+    """
+    start = time.perf_counter()
+    stats = {}
+    size = 0
+    f = open(output, 'wb') if isinstance(output, (str, os.PathLike)) else output
+    try:
+        for chunk in iter_notebook(template, pages, chunk_size, stats):
+            f.write(chunk)
+            size += len(chunk)
+    finally:
+        if f is not output:
+            f.close()
+    return NotebookResult(stats['pages'], size, time.perf_counter() - start, stats['variants'])
+
+
+def main(argv=None):
+    import argparse
+    import numpy as np
+    from convert_color import normalize_color
+
+    parser = argparse.ArgumentParser(prog='python -m notebook', description='Stream a long numbered notebook to a PDF.')
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--output', '-o', default='notebook.pdf')
+    parser.add_argument('--pattern', choices=['grid', 'dotted', 'ruled', 'blank'], default='dotted')
+    parser.add_argument('--grid-size', type=float, default=5)
+    parser.add_argument('--start-date', type=datetime.date.fromisoformat, help='date header from this day (YYYY-MM-DD)')
+    parser.add_argument('--no-mirror', action='store_true', help='same margins on left and right pages')
+    parser.add_argument('--memory', action='store_true', help='report the peak memory (tracemalloc; slower)')
+    args = parser.parse_args(argv)
+
+    template = dict(paper_width=210, paper_height=297, pattern=args.pattern, pattern2=None,
+                    grid_color=normalize_color('#d2d2d2'), line_color=normalize_color('#c4151e', 0.7),
+                    bg_color=normalize_color('#ffffff'), table_color=normalize_color('#d2d2d2'),
+                    grid_size=args.grid_size, grid_line_width=0.1, line_width=0.25, cue_perc_left=0, cue_perc_right=0,
+                    summary_perc=0, title_perc=4, rows=1, columns=1, margin=np.array([15, 15, 10, 15]))
+    margins = None if args.no_mirror else (np.array([15, 15, 10, 15]), np.array([10, 15, 15, 15]))
+    pages = numbered_pages(args.pages, args.start_date, margins, footer='{number} / {count}',
+                           paper=(template['paper_width'], template['paper_height']))
+
+    if args.memory:
+        import tracemalloc
+        tracemalloc.start()
+    result = write_notebook(template, pages, args.output)
+    print(f'{result.pages} pages ({result.variants} variants), {result.size} bytes written to {args.output} '
+          f'in {result.elapsed:.2f} s: {result.pages_per_second:.0f} pages/s')
+    if args.memory:
+        print(f'peak traced memory {tracemalloc.get_traced_memory()[1] / 1e6:.2f} MB')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import functools
+from lazy_modules import lazy_import
+
+np = lazy_import('numpy')
+
+# ISO A-series paper sizes in mm, portrait
+PAPERS = {'A6': (105, 148), 'A5': (148, 210), 'A4': (210, 297), 'A3': (297, 420),
+          'A2': (420, 594), 'A1': (594, 841), 'A0': (841, 1189)}
+
+
+class PageGeometry:
+    """
+    Positions of the grid lines, title/summary/cue lines and table of one page layout, in points.
+
+    Only the 1-D x and y axes are kept (every grid line position, margins included, plus the
+    closing edge of the pattern area), so memory is O(rows + columns). A geometry depends on the
+    layout alone, not on colours, and its arrays are read-only so one instance can be shared by
+    every PDF with the same layout (see layout()).
+    """
+    __slots__ = ('paper_width', 'paper_height', 'grid_size', 'margin', 'pattern_width', 'pattern_height',
+                 'grid_columns', 'grid_rows', 'x', 'y',
+                 'title_index', 'summary_index', 'cue_index_left', 'cue_index_right',
+                 'title_y', 'summary_y', 'cue_y1', 'cue_y2', 'cue_x',
+                 'table_x1', 'table_x2', 'table_rows_y', 'table_y1', 'table_y2', 'table_columns_x', 'table_vertical')
+
+    def __init__(self, paper_width, paper_height, grid_size, margin, title_perc, summary_perc,
+                 cue_perc_left, cue_perc_right, line_width, rows=None, columns=None,
+                 row_weights=None, column_weights=None, header_bands=None):
+        """
+        Compute the geometry of a page layout.
+
+        :param paper_width:         Width of the paper in points
+        :param paper_height:        Height of the paper in points
+        :param grid_size:           Size of the grid cells in points
+        :param margin:              Page margins in points (left, top, right, bottom)
+        :param title_perc:          Percentage position of the title line
+        :param summary_perc:        Percentage position of the summary line
+        :param cue_perc_left:       Percentage position of the left cue line
+        :param cue_perc_right:      Percentage position of the right cue line
+        :param line_width:          Width of the title, summary and cue lines in points
+        :param rows:                Number of table rows, or None for a page without table
+        :param columns:             Number of table columns, or None for a page without table
+        :param row_weights:         Relative heights of the table rows, or None for equal rows
+        :param column_weights:      Relative widths of the table columns, or None for equal columns
+        :param header_bands:        Merged header cells: for each of the top table rows, the number of
+                                    columns every cell of that row spans (summing to columns)
+        """
+        self.paper_width = paper_width
+        self.paper_height = paper_height
+        self.grid_size = grid_size
+        self.margin = margin
+
+        # Pattern area and number of whole grid cells in it
+        self.pattern_width = paper_width - (margin[0] + margin[2])
+        self.pattern_height = paper_height - (margin[1] + margin[3])
+        self.grid_columns = int(self.pattern_width / grid_size)
+        self.grid_rows = int(self.pattern_height / grid_size)
+
+        # Grid line positions: every grid_size from the margin, plus the far edge of the pattern area
+        self.x = np.append(np.arange(0, self.pattern_width, grid_size), self.pattern_width) + margin[0]
+        self.y = np.append(np.arange(0, self.pattern_height, grid_size), self.pattern_height) + margin[1]
+
+        # Title, summary and cue lines; cue lines run between the title and summary lines
+        self.title_index = (title_perc * self.grid_rows) // 100
+        self.summary_index = self.grid_rows - (summary_perc * self.grid_rows) // 100
+        self.cue_index_left = int((cue_perc_left * self.grid_columns) // 100)
+        self.cue_index_right = self.grid_columns - int((cue_perc_right * self.grid_columns) // 100)
+
+        self.cue_y1 = self.y[0]
+        self.cue_y2 = self.y[-1]
+        self.title_y = None
+        self.summary_y = None
+        if self.title_index != 0:
+            self.title_y = self.y[self.title_index]
+            self.cue_y1 = self.title_y + line_width / 2
+        if self.summary_index != self.grid_rows:
+            self.summary_y = self.y[self.summary_index]
+            self.cue_y2 = self.summary_y - line_width / 2
+        self.cue_x = [self.x[index] for index in (self.cue_index_left, self.cue_index_right)
+                      if index != 0 and index != self.grid_columns]
+
+        self.table_x1 = self.table_x2 = self.table_rows_y = None
+        self.table_y1 = self.table_y2 = self.table_columns_x = self.table_vertical = None
+        if rows is not None:
+            self.layout_table(rows, columns, line_width, row_weights, column_weights, header_bands)
+
+        for axis in (self.x, self.y) + ((self.table_rows_y, self.table_columns_x) + self.table_vertical
+                                        if rows is not None else ()):
+            axis.flags.writeable = False
+
+    def layout_table(self, rows, columns, line_width, row_weights=None, column_weights=None, header_bands=None):
+        # Place the table between the title, summary and cue lines. Every row and column gets its
+        # share of the space by weight, rounded to whole grid cells, and all boundaries are laid out
+        # at once from the cumulative cell counts
+        x, y, g = self.x, self.y, self.grid_size
+        height = (y[self.summary_index] if self.summary_index != 0 else y[-1]) - y[self.title_index]
+        width = x[self.cue_index_right] - x[self.cue_index_left]
+        row_cells = snap_rows(table_sizes(height, rows, row_weights, 'row'), g)
+        column_cells = snap_columns(table_sizes(width, columns, column_weights, 'column'), g)
+
+        # Horizontal lines, with the rows counted from the title line (the top of the pattern without one)
+        self.table_x1 = x[0] if self.cue_index_left == 0 else x[self.cue_index_left]
+        self.table_x2 = x[-1] if self.cue_index_right == 0 else x[self.cue_index_right]
+        self.table_rows_y = y[self.title_index] + boundaries(row_cells, g)
+
+        # Vertical lines, between the title and summary lines and broken off by merged header cells
+        self.table_y1 = y[0] if self.title_index == 0 else y[self.title_index] + line_width / 2
+        self.table_y2 = y[-1] if self.summary_index == self.grid_rows else y[self.summary_index] - line_width / 2
+        self.table_columns_x = self.table_x1 + boundaries(column_cells, g)
+        self.table_vertical = header_segments(self.table_columns_x, self.table_y1, self.table_rows_y, self.table_y2,
+                                              columns, header_bands or ())
+
+    def __repr__(self):
+        return (f'PageGeometry({self.paper_width:.1f} x {self.paper_height:.1f} pt, '
+                f'{self.grid_columns} x {self.grid_rows} cells of {self.grid_size:.2f} pt)')
+
+
+def table_sizes(space, count, weights, axis):
+    """Share of `space` of each of `count` table rows or columns, by weight (equal without weights)."""
+    if weights is None:
+        return np.full(count, space / count)
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (count,) or not (weights > 0).all():
+        raise ValueError(f"Unsupported {axis} weights: {weights.tolist()} (use {count} positive numbers)")
+    return space * weights / weights.sum()
+
+
+def snap_rows(heights, grid_size):
+    """Row heights in whole grid cells: rounded up, less one cell, so the rows stay clear of the line below."""
+    return -(heights // -grid_size + 1)
+
+
+def snap_columns(widths, grid_size):
+    """Column widths in whole grid cells, rounded to the nearest (halves up)."""
+    cells = widths // grid_size
+    return cells + (np.round(widths / grid_size - cells, 5) >= 0.5)
+
+
+def boundaries(cells, grid_size):
+    """Offsets of the lines between rows or columns of the given sizes in grid cells, from the first edge."""
+    if (cells == cells[0]).all():
+        return cells[0] * grid_size * np.arange(1, len(cells))      # equal steps, exactly as uniform tables always were
+    return grid_size * np.cumsum(cells[:-1])
+
+
+def header_segments(columns_x, y1, rows_y, y2, columns, header_bands):
+    """
+    Vertical table lines as segments, broken off where merged header cells span them.
+
+    :param columns_x:       x of the lines between the columns
+    :param y1:              Top of the table
+    :param rows_y:          y of the lines between the rows
+    :param y2:              Bottom of the table
+    :param columns:         Number of columns
+    :param header_bands:    For each of the top rows with merged cells, the columns spanned by each cell
+    :return:                (x, y1, y2) arrays of the segments, as few as the merged cells allow
+    """
+    bands = len(header_bands)
+    if bands > len(rows_y) + 1:
+        raise ValueError(f"Unsupported header bands: {bands} bands in a table of {len(rows_y) + 1} rows")
+    for spans in header_bands:
+        if sum(spans) != columns or min(spans) <= 0:
+            raise ValueError(f"Unsupported header band: {list(spans)} (use positive spans summing to {columns})")
+
+    # visible[line, band]: the line between columns `line` and `line + 1` crosses the band; the body
+    # of the table below the header bands is the last band and is crossed by every line
+    visible = np.zeros((columns - 1, bands + 1), dtype=bool)
+    visible[:, bands] = True
+    ends = [np.cumsum(spans)[:-1] - 1 for spans in header_bands]
+    if ends:
+        visible[np.concatenate(ends).astype(int), np.repeat(np.arange(bands), [len(end) for end in ends])] = True
+
+    # One segment per run of crossed bands. band_y holds the tops of the bands and of the body, then the
+    # bottom of the table; the body is empty when every row is a band
+    band_y = np.concatenate((np.concatenate(([y1], rows_y, [y2]))[:bands + 1], [y2]))
+    steps = np.diff(np.pad(visible, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    lines, starts = np.nonzero(steps == 1)
+    stops = np.nonzero(steps == -1)[1]
+    keep = band_y[starts] != band_y[stops]
+    return columns_x[lines[keep]], band_y[starts[keep]], band_y[stops[keep]]
+
+
+@functools.lru_cache(maxsize=256)
+def layout(paper_width, paper_height, grid_size, margin, title_perc, summary_perc,
+           cue_perc_left, cue_perc_right, line_width, rows=None, columns=None,
+           row_weights=None, column_weights=None, header_bands=None):
+    """
+    PageGeometry for a layout, computed once and shared; takes the PageGeometry arguments, with
+    margin and weights as tuples and header_bands as a tuple of tuples.
+    """
+    return PageGeometry(paper_width, paper_height, grid_size, margin, title_perc, summary_perc,
+                        cue_perc_left, cue_perc_right, line_width, rows, columns,
+                        row_weights, column_weights, header_bands)
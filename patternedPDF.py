@@ -1,18 +1,27 @@
-import numpy as np
+import io
 import os
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from reportlab.lib.colors import Color
-import convert_color        # import from file convert color in the working directory
+import pdf_writer
+import page_geometry
+import instrumentation
+from lazy_modules import lazy_import
+
+# NumPy and reportlab are imported on first use so that importing this module stays cheap
+np = lazy_import('numpy')
+canvas = lazy_import('reportlab.pdfgen.canvas')
+rl_accel = lazy_import('reportlab.lib.rl_accel')
+pdfdoc = lazy_import('reportlab.pdfbase.pdfdoc')
+
+mm = 72 / 25.4      # same value as reportlab.lib.units.mm
 
 class PatternedPDF:
     def __init__(self, output_folder, pdf_name, paper_width, paper_height, pattern, pattern2, grid_color, line_color,
                  bg_color, table_color, grid_size, grid_line_width, line_width, cue_perc_left, cue_perc_right, summary_perc, title_perc,
-                 rows, columns, margin):
+                 rows, columns, margin, render_mode='paths', pages=1, backend='reportlab', compress=True, instrument=None,
+                 reproducible=False, row_weights=None, column_weights=None, header_bands=None):
         """
         Initialize the PatternedPDF object with given parameters.
 
-        :param output_folder:       Directory to save the PDF
+        :param output_folder:       Directory to save the PDF (None when the PDF is only rendered in memory)
         :param pdf_name:            Name of the PDF file
         :param paper_width:         Width of the paper in mm
         :param paper_height:        Height of the paper in mm
@@ -32,7 +41,24 @@ class PatternedPDF:
         :param rows:                Number of rows for the table
         :param columns:             Number of columns for the table
         :param margin:              Page margins (list of 4 values: left, top, right, bottom)
+        :param render_mode:         How the pattern is drawn ('paths' for explicit lines, 'tiling' for a PDF tiling pattern)
+        :param pages:               Number of identical pages; with more than one, the page is drawn once as a form XObject
+        :param backend:             PDF writer ('reportlab' for the reportlab canvas, 'direct' for pdf_writer.DirectCanvas)
+        :param compress:            Flate-compress the content streams
+        :param instrument:          instrumentation.Instrumentation recording the rendering phases, or None
+        :param reproducible:        Byte-identical output for identical inputs: reportlab's invariant mode, with a fixed
+                                    creation date (SOURCE_DATE_EPOCH if set) and a document ID derived from layout_key().
+                                    The direct backend writes no date or ID and is always reproducible
+        :param row_weights:         Relative heights of the table rows (list of `rows` numbers), or None for equal rows
+        :param column_weights:      Relative widths of the table columns (list of `columns` numbers), or None for equal columns
+        :param header_bands:        Merged header cells of the table: one list per top row, of the number of columns
+                                    each cell of the row spans, e.g. [[7], [1] * 7] for a week title over seven days
         """
+        if render_mode not in ('paths', 'tiling'):
+            raise ValueError(f"Unsupported render mode: {render_mode}")
+        if backend not in ('reportlab', 'direct'):
+            raise ValueError(f"Unsupported backend: {backend}")
+
         self.output_folder = output_folder
         self.pdf_name = pdf_name
         self.paper_width = paper_width * mm
@@ -53,132 +79,398 @@ class PatternedPDF:
         self.rows = rows
         self.columns = columns
         self.margin = margin * mm
-        self.pdf_path = f'{output_folder}/{pdf_name}.pdf'
+        self.render_mode = render_mode
+        self.pages = pages
+        self.backend = backend
+        self.compress = compress
+        self.instrument = instrument
+        self.reproducible = reproducible
+        self.row_weights = row_weights
+        self.column_weights = column_weights
+        self.header_bands = header_bands
+        self.pdf_path = f'{output_folder}/{pdf_name}.pdf' if output_folder is not None else None
+
+    def create_patterned_pdf(self, output=None):
+        # Create the PDF with the specified pattern and parameters. It is saved to `output`, a path
+        # or a binary file-like object; by default to pdf_path, or to memory without an output folder.
+        if output is None:
+            output = self.pdf_path if self.pdf_path is not None else io.BytesIO()
+        if isinstance(output, (str, os.PathLike)) and os.path.dirname(output):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        with self.phase('canvas'):
+            pdf = self.create_canvas(output)
+        if self.instrument is not None:
+            # Time the serialization and record the output size when the caller saves the PDF
+            pdf.save = self.instrument.wrap_output(self.template_name(), 'save', pdf.save, output)
+            pdf.getpdfdata = self.instrument.wrap_output(self.template_name(), 'serialize', pdf.getpdfdata)
+
+        if self.pages == 1:
+            self.draw_page(pdf)
+            pdf.showPage()
+        else:
+            # Record the page once as a form XObject and reference it from every page
+            name = self.unique_form_name(pdf, 'page')
+            pdf.beginForm(name)
+            self.draw_page(pdf)
+            self.end_form(pdf)
+
+            with self.phase('pages'):
+                for _ in range(self.pages):
+                    pdf.doForm(name)
+                    pdf.showPage()
+                self.share_page_contents(pdf, self.pages)
+
+        return pdf
+
+    def phase(self, name, pdf=None):
+        # Context recording one rendering phase with the instrumentation; a shared no-op without it
+        if self.instrument is None:
+            return instrumentation.NO_PHASE
+        return self.instrument.phase(self.template_name(), name, pdf)
+
+    def template_name(self):
+        # Name of the template in instrumentation records: output_folder/pdf_name, or pdf_name in memory
+        return self.pdf_name if self.output_folder is None else f'{self.output_folder}/{self.pdf_name}'
+
+    def create_canvas(self, output):
+        # Create the canvas of the selected backend; both offer the same drawing methods
+        if self.backend == 'direct':
+            return pdf_writer.DirectCanvas(output, pagesize=(self.paper_width, self.paper_height),
+                                           pageCompression=self.compress)
+        pdf = canvas.Canvas(output, pagesize=[self.paper_width, self.paper_height],
+                            pageCompression=self.compress, invariant=1 if self.reproducible else None)
+        if self.reproducible:
+            # Invariant mode gives every document the same ID; derive it from what the pages show instead
+            pdf._doc.updateSignature(repr(self.layout_key()))
+        return pdf
 
-    def create_patterned_pdf(self):
-        # Create the PDF with the specified pattern and parameters
-        os.makedirs(self.output_folder, exist_ok=True)
-        pdf = canvas.Canvas(self.pdf_path, pagesize=[self.paper_width, self.paper_height])
+    def to_bytes(self):
+        # Render the PDF in memory and return it, without touching the filesystem
+        return self.create_patterned_pdf(io.BytesIO()).getpdfdata()
+
+    def to_png(self, dpi=36):
+        # Rasterize the page with NumPy (see preview.py) and return it as PNG bytes; no PDF is written
+        import preview
+        return preview.encode_png(preview.render_preview(self, dpi))
+
+    def iter_chunks(self, chunk_size=65536):
+        # Render the PDF in memory and yield it in chunks of chunk_size bytes (the last one shorter).
+        # The direct backend serializes the document object by object while it is consumed.
+        pdf = self.create_patterned_pdf(io.BytesIO())
+        pieces = pdf.iter_pdfdata() if self.backend == 'direct' else [pdf.getpdfdata()]
+        buffer = bytearray()
+        for piece in pieces:
+            buffer += piece
+            while len(buffer) >= chunk_size:
+                yield bytes(buffer[:chunk_size])
+                del buffer[:chunk_size]
+        if buffer:
+            yield bytes(buffer)
+
+    def draw_page(self, pdf):
+        # Draw the background, pattern, title/cue/summary lines and table of one page
+        self.draw_background(pdf)
+        self.draw_overlay(pdf)
+
+    def flip(self, pdf):
+        # Put the origin at the top left corner, with y running down the page
         pdf.translate(0, self.paper_height)
         pdf.scale(1, -1)
-        
-        # Set the bg color
-        pdf.setFillColorRGB(*self.bg_color)
-        pdf.rect(0, 0, self.paper_width, self.paper_height, fill=1, stroke=0)
-
-        # Calculate the number of grid columns and rows
-        self.grid_columns = int(self.paper_width / self.grid_size)
-        self.grid_rows = int(self.paper_height / self.grid_size)
-
-        # if self.pattern2 == 'table' and self.pattern != 'blank':
-        #     if self.pattern != 'ruled':
-        #         if self.grid_columns % self.columns != 0:
-        #             self.grid_columns = self.grid_columns // self.columns * self.columns
-        #     if self.grid_rows % self.rows != 0:
-        #         self.grid_rows = self.grid_rows // self.rows * self.rows
-                
-        # Adjust grid columns and rows based on margin and pattern
-        self.pattern_width = self.paper_width - (self.margin[0] + self.margin[2])
-        self.pattern_height = self.paper_height - (self.margin[1] + self.margin[3])
-        
-        self.margin_horizontal = self.margin[0] + self.margin[2]
-        self.margin_vertical = self.margin[1] + self.margin[3]
-        self.grid_columns = int(self.pattern_width / self.grid_size)
-        self.grid_rows = int(self.pattern_height / self.grid_size)
-        
-        # Create the mesh grid for the pattern
-        self.create_meshgrid()
-        
-        self.x_mesh_extended = self.x_mesh_extended + self.margin[0]
-        self.y_mesh_extended = self.y_mesh_extended + self.margin[1]
-        
-        # Set the grid color and line width
-        pdf.setStrokeColor(Color(*self.grid_color))
-        pdf.setFillColor(Color(*self.grid_color))
-        pdf.setLineWidth(self.grid_line_width)
-        r = self.line_width / 2
 
-        # Draw the specified pattern
-        if self.pattern == 'grid':
-            self.draw_grid(pdf)
-        elif self.pattern == 'dotted':
-            self.draw_dotted(pdf)
-        elif self.pattern == 'ruled':
-            self.draw_ruled(pdf)
-        elif self.pattern == 'blank':
-            self.draw_blank(pdf)
-        
-        # Calculate line positions
-        title_index = (self.title_perc * (self.grid_rows)) // 100
-        summary_index = self.grid_rows - (self.summary_perc * (self.grid_rows)) // 100
-        cue_index_left = int((self.cue_perc_left * (self.grid_columns)) // 100)
-        cue_index_right = self.grid_columns - int((self.cue_perc_right * (self.grid_columns)) // 100)
-        self.cue_y1 = self.y_mesh_extended[0, 0]
-        self.cue_y2 = self.y_mesh_extended[-1, 0]
-
-        # Draw lines
-        pdf.setStrokeColor(Color(*self.line_color))
-        pdf.setLineWidth(self.line_width)
-        
-        self.draw_title_line(pdf, title_index)
-        self.draw_summary_line(pdf, summary_index)
-        self.draw_cue_line(pdf, cue_index_left, self.cue_y1, self.cue_y2)
-        self.draw_cue_line(pdf, cue_index_right, self.cue_y1, self.cue_y2)
-        
+    def draw_background(self, pdf):
+        # Draw the background layer: the page colour and the pattern. It only depends on
+        # background_key(), so pages that differ in their overlay can share it as a form XObject
+        with self.phase('background', pdf):
+            self.flip(pdf)
+
+            # Set the bg color
+            pdf.setFillColorRGB(*self.bg_color)
+            pdf.rect(0, 0, self.paper_width, self.paper_height, fill=1, stroke=0)
+
+        # Positions of the grid, lines and table, shared by every PDF with the same layout
+        with self.phase('geometry'):
+            self.geometry = self.create_geometry()
+
+        # Colours and widths are only set for what is drawn, so unused settings do not change the output
+        with self.phase('pattern', pdf):
+            if self.pattern != 'blank':
+                # Set the grid color and line width
+                pdf.setStrokeColorRGB(*self.rgba(self.grid_color))
+                pdf.setFillColorRGB(*self.rgba(self.grid_color))
+                pdf.setLineWidth(self.grid_line_width)
+
+            # Draw the specified pattern
+            if self.pattern == 'grid':
+                self.draw_grid(pdf)
+            elif self.pattern == 'dotted':
+                self.draw_dotted(pdf)
+            elif self.pattern == 'ruled':
+                self.draw_ruled(pdf)
+            elif self.pattern == 'blank':
+                self.draw_blank(pdf)
+
+    def draw_overlay(self, pdf):
+        # Draw the overlay layer: title, summary and cue lines and the table, in the page
+        # coordinates set up by draw_background (or by flip() when the background is a form)
+        with self.phase('lines', pdf):
+            if self.has_lines() or self.pattern2 == 'table':
+                pdf.setLineWidth(self.line_width)
+
+            # Draw lines
+            if self.has_lines():
+                pdf.setStrokeColorRGB(*self.rgba(self.line_color))
+                self.draw_title_line(pdf)
+                self.draw_summary_line(pdf)
+                self.draw_cue_lines(pdf)
+
         # Draw table if pattern2 is 'table'
-        pdf.setStrokeColor(Color(*self.table_color))
-        
+        with self.phase('table', pdf):
+            if self.pattern2 == 'table':
+                pdf.setStrokeColorRGB(*self.rgba(self.table_color))
+                self.draw_table(pdf)
+
+    def has_lines(self):
+        # Whether the page has a title, summary or cue line
+        geometry = self.geometry
+        return geometry.title_y is not None or geometry.summary_y is not None or len(geometry.cue_x) > 0
+
+    def layout_key(self):
+        # Everything that decides the output once the layout is resolved: line positions, colours
+        # and widths actually used, and output settings. PDFs with equal keys have the same pages;
+        # e.g. a blank page does not depend on the grid colour, and cue percentages that round to
+        # the same grid column give the same key.
+        return (('output', self.backend, bool(self.compress), self.pages, bool(self.reproducible)),) + \
+            self.background_key() + self.overlay_key()
+
+    def background_key(self):
+        # The part of layout_key() drawn by draw_background: paper, page colour and pattern
+        values = lambda array: tuple(float(v) for v in array)
+        key = [('page', float(self.paper_width), float(self.paper_height), values(self.bg_color))]
+        if self.pattern != 'blank':
+            key.append(('pattern', self.pattern, self.render_mode, values(self.rgba(self.grid_color)),
+                        float(self.grid_size), float(self.grid_line_width), values(self.margin),
+                        float(self.line_width) if self.pattern == 'dotted' else None))
+        return tuple(key)
+
+    def overlay_key(self):
+        # The part of layout_key() drawn by draw_overlay: title, summary and cue lines and table
+        self.geometry = geometry = self.create_geometry()
+        values = lambda array: tuple(float(v) for v in array)
+        key = []
+        if self.has_lines():
+            key.append(('lines', values(self.rgba(self.line_color)), float(self.line_width),
+                        float(geometry.x[0]), float(geometry.x[-1]),
+                        None if geometry.title_y is None else float(geometry.title_y),
+                        None if geometry.summary_y is None else float(geometry.summary_y),
+                        values(geometry.cue_x), float(geometry.cue_y1), float(geometry.cue_y2)))
         if self.pattern2 == 'table':
-            self.draw_table(pdf, title_index, cue_index_left, cue_index_right, summary_index)
-        
-        pdf.showPage()
-        
-        return pdf
-        
-    def create_meshgrid(self):
-        # Create a mesh grid based on the pattern width and height
-        self.x_coordinates = np.arange(0, self.pattern_width, self.grid_size)
-        self.y_coordinates = np.arange(0, self.pattern_height, self.grid_size)
-
-        self.x_mesh, self.y_mesh = np.meshgrid(self.x_coordinates, self.y_coordinates)
-        self.x_mesh_extended = np.concatenate([self.x_mesh, np.ones_like(self.x_mesh[:, 0:1]) * self.pattern_width], axis=1)
-        self.y_mesh_extended = np.concatenate([self.y_mesh, np.ones_like(self.y_mesh[0:1, :]) * self.pattern_height], axis=0)
-        self.x_mesh_extended = np.concatenate([self.x_mesh_extended, self.x_mesh_extended[0:1, :]], axis=0)
-        self.y_mesh_extended = np.concatenate([self.y_mesh_extended, self.y_mesh_extended[:, 0:1]], axis=1)
+            key.append(('table', values(self.rgba(self.table_color)), float(self.line_width),
+                        float(geometry.table_x1), float(geometry.table_x2), values(geometry.table_rows_y),
+                        float(geometry.table_y1), float(geometry.table_y2),
+                        tuple(values(axis) for axis in geometry.table_vertical)))
+        return tuple(key)
+
+    def create_geometry(self):
+        # Look up the geometry of this page layout; colours and output settings do not affect it
+        table = self.pattern2 == 'table'
+        values = lambda array: None if array is None or not table else tuple(float(v) for v in array)
+        header_bands = tuple(tuple(int(v) for v in band) for band in self.header_bands) if table and self.header_bands else None
+        return page_geometry.layout(self.paper_width, self.paper_height, self.grid_size, tuple(self.margin.tolist()),
+                                    self.title_perc, self.summary_perc, self.cue_perc_left, self.cue_perc_right,
+                                    self.line_width, self.rows if table else None, self.columns if table else None,
+                                    values(self.row_weights), values(self.column_weights), header_bands)
+
+    def rgba(self, color):
+        # (r, g, b, alpha) of a colour given as RGB or RGBA values; RGB colours are opaque
+        return (*color[:3], color[3] if len(color) > 3 else 1)
+
+    def unique_form_name(self, pdf, prefix):
+        # Return the first of prefix0, prefix1, ... not yet used as a form name in the document
+        n = 0
+        while pdf.hasForm(f'{prefix}{n}'):
+            n += 1
+        return f'{prefix}{n}'
+
+    def share_page_contents(self, pdf, count):
+        # Point the last `count` pages, which all draw the same form, at one shared content
+        # stream and resource dictionary so every extra page only adds its page dictionary.
+        # The direct backend already writes identical streams and resources once.
+        if self.backend == 'direct':
+            return
+        pages = pdf._doc.Pages.pages[-count:]
+        pages[0].check_format(pdf._doc)
+        contents = pdf._doc.Reference(pages[0].Contents)
+        resources = pdf._doc.Reference(pages[0].Resources)
+        for page in pages:
+            page.Contents = contents
+            page.Resources = resources
+
+    def end_form(self, pdf, **resources):
+        # Close a form XObject started with pdf.beginForm(). reportlab leaves the ExtGState
+        # (alpha) entries out of form resources, so they are added here together with the
+        # nested forms in use and any extra entries such as Pattern. The direct backend
+        # takes the extra entries as PDF object strings and adds the rest itself.
+        if self.backend == 'direct':
+            pdf.endForm(**resources)
+            return
+        form_resources = pdfdoc.PDFResourceDictionary(**resources)
+        form_resources.basicFonts()
+        form_resources.ExtGState = pdf._extgstate.getState() or {}
+        if pdf._formsinuse:
+            form_resources.XObject = pdf._doc.xobjDict(pdf._formsinuse)
+        pdf.endForm(Resources=form_resources)
+
+    def horizontal_line_positions(self):
+        # y positions of the horizontal lines, skipping the page edges not covered by a margin
+        y = self.geometry.y
+        return y[~(((self.margin[0] == 0) & (y == 0)) | ((self.margin[2] == 0) & (y == self.paper_height)))]
+
+    def vertical_line_positions(self):
+        # x positions of the vertical lines, skipping the page edges not covered by a margin
+        x = self.geometry.x
+        return x[~(((self.margin[1] == 0) & (x == 0)) | ((self.margin[3] == 0) & (x == self.paper_width)))]
 
     def draw_horizontal_lines(self, pdf):
-        # Draw horizontal lines based on the mesh grid
-        for row in self.y_mesh_extended[:, 0]:
-            y = row
-
-            if self.margin[0] == 0 and y == 0:
-                pass
-            elif self.margin[2] == 0 and y == self.paper_height:
-                pass
-            else:
-                pdf.line(self.x1, y, self.x2, y)
+        # Draw horizontal lines at the grid positions
+        y = self.horizontal_line_positions()
+
+        if self.render_mode == 'tiling':
+            self.tile_lines(pdf, y, self.x1, self.x2, vertical=False)
+        else:
+            self.stroke_segments(pdf, np.full_like(y, self.x1), y, np.full_like(y, self.x2), y)
 
     def draw_grid(self, pdf):
         # Draw a grid pattern
         
         # Horizontal lines
-        self.x1 = self.x_mesh_extended[0, 0]
-        self.x2 = self.x_mesh_extended[0, -1]
+        self.x1 = self.geometry.x[0]
+        self.x2 = self.geometry.x[-1]
         self.draw_horizontal_lines(pdf)
 
         # Vertical lines
-        self.y1 = self.y_mesh_extended[0, 0]
-        self.y2 = self.y_mesh_extended[-1, 0]
+        self.y1 = self.geometry.y[0]
+        self.y2 = self.geometry.y[-1]
+        x = self.vertical_line_positions()
 
-        for col in self.x_mesh_extended[0, :]:
-            x = col
-
-            if self.margin[1] == 0 and x == 0:
-                pass
-            elif self.margin[3] == 0 and x == self.paper_width:
-                pass
+        if self.render_mode == 'tiling':
+            self.tile_lines(pdf, x, self.y1, self.y2, vertical=True)
+        else:
+            self.stroke_segments(pdf, x, np.full_like(x, self.y1), x, np.full_like(x, self.y2))
+
+    def stroke_segments(self, pdf, x1, y1, x2, y2):
+        # Stroke all segments as one path with a single paint operator,
+        # formatting every distinct coordinate only once.
+        # Horizontal and vertical lines are kept in separate paths so that
+        # translucent colours still darken the crossings exactly as before.
+        if len(x1) == 0:
+            return
+
+        values, inverse = np.unique(np.concatenate([x1, y1, x2, y2]), return_inverse=True)
+        x1, y1, x2, y2 = self.format_numbers(values)[inverse].reshape(4, -1).tolist()      # str is faster to format than np.str_
+        pdf.addLiteral('n\n' + '\n'.join(map('{} {} m {} {} l'.format, x1, y1, x2, y2)) + '\nS')
+
+    def format_numbers(self, values):
+        # Format an array of coordinates as PDF numbers, the way the selected backend writes them
+        if self.backend == 'direct':
+            return pdf_writer.format_numbers(values)
+        return np.array([rl_accel.fp_str(v) for v in values.tolist()], dtype=object)
+
+    def fp_str(self, *values):
+        # Format a few numbers, separated by spaces, the way the selected backend writes them
+        if self.backend == 'direct':
+            return pdf_writer.fmt(*values)
+        return rl_accel.fp_str(*values)
+
+    def split_on_grid(self, positions):
+        # Split line positions into the evenly spaced run starting at the first line
+        # and the leftovers (e.g. a closing edge line that is not a whole grid step away)
+        steps = np.rint((positions - positions[:1]) / self.grid_size)
+        on_grid = (steps == np.arange(len(positions))) & \
+                  (np.abs(positions - positions[:1] - steps * self.grid_size) < 1e-6 * self.grid_size)
+        return positions[on_grid], positions[~on_grid]
+
+    def tile_lines(self, pdf, positions, start, end, vertical):
+        # Draw parallel grid lines as one tiling pattern cell repeated every grid_size,
+        # falling back to explicit lines for the leftovers
+        fp_str = self.fp_str
+        regular, leftover = self.split_on_grid(positions)
+        if len(regular) < 2:
+            regular, leftover = regular[:0], positions
+
+        if len(leftover):
+            if vertical:
+                self.stroke_segments(pdf, leftover, np.full_like(leftover, start), leftover, np.full_like(leftover, end))
             else:
-                pdf.line(x, self.y1, x, self.y2)
+                self.stroke_segments(pdf, np.full_like(leftover, start), leftover, np.full_like(leftover, end), leftover)
+        if len(regular) == 0:
+            return
+
+        g = self.grid_size
+        length = end - start
+        span = len(regular) * g
+        if vertical:
+            cell = f'{fp_str(self.grid_line_width)} w {fp_str(g / 2, 0)} m {fp_str(g / 2, length)} l S'
+            self.fill_tiled(pdf, cell, g, length, regular[0] - g / 2, start, span, length)
+        else:
+            cell = f'{fp_str(self.grid_line_width)} w {fp_str(0, g / 2)} m {fp_str(length, g / 2)} l S'
+            self.fill_tiled(pdf, cell, length, g, start, regular[0] - g / 2, length, span)
+
+    def tile_dots(self, pdf):
+        # Draw the dotted pattern as one dot cell repeated every grid_size in both
+        # directions, falling back to explicit dotted lines for off-grid rows
+        fp_str = self.fp_str
+        regular, leftover = self.split_on_grid(self.horizontal_line_positions())
+        period = self.grid_size + 0.0000001         # same spacing as the dash pattern
+        dots = int((self.x2 - self.x1) // period) + 1 if self.x2 >= self.x1 else 0
+        if len(regular) < 2 or dots < 2:
+            regular, leftover = regular[:0], self.horizontal_line_positions()
+
+        if len(leftover):
+            self.stroke_segments(pdf, np.full_like(leftover, self.x1), leftover, np.full_like(leftover, self.x2), leftover)
+        if len(regular) == 0:
+            return
+
+        g = self.grid_size
+        r = self.line_width / 2
+        k = 0.5523 * r                              # Bezier control offset for a quarter circle
+        c = g / 2
+        cell = (f'{fp_str(c + r, c)} m '
+                f'{fp_str(c + r, c + k, c + k, c + r, c, c + r)} c '
+                f'{fp_str(c - k, c + r, c - r, c + k, c - r, c)} c '
+                f'{fp_str(c - r, c - k, c - k, c - r, c, c - r)} c '
+                f'{fp_str(c + k, c - r, c + r, c - k, c + r, c)} c f')
+        self.fill_tiled(pdf, cell, g, g, self.x1 - c, regular[0] - c, dots * g, len(regular) * g)
+
+    def fill_tiled(self, pdf, cell, cell_width, cell_height, x, y, width, height):
+        # Fill a rectangle with an uncoloured tiling pattern, in the grid color, whose cell is
+        # anchored at (x, y). The fill is wrapped in a form XObject so the pattern gets its own
+        # resources; the alpha of the current fill color still applies.
+        fp_str = self.fp_str
+        if self.backend == 'direct':
+            pattern = pdf.add_stream(f'/Type /Pattern /PatternType 1 /PaintType 2 /TilingType 1 '
+                                     f'/BBox [{fp_str(0, 0, cell_width, cell_height)}] '
+                                     f'/XStep {fp_str(cell_width)} /YStep {fp_str(cell_height)} '
+                                     f'/Matrix [{fp_str(1, 0, 0, 1, x, y)}] /Resources << >>', cell)
+            color_space = '[/Pattern /DeviceRGB]'
+        else:
+            pattern = pdf._doc.Reference(pdfdoc.PDFStream(pdfdoc.PDFDictionary({
+                'Type': pdfdoc.PDFName('Pattern'),
+                'PatternType': 1,
+                'PaintType': 2,
+                'TilingType': 1,
+                'BBox': pdfdoc.PDFArray([0, 0, cell_width, cell_height]),
+                'XStep': cell_width,
+                'YStep': cell_height,
+                'Matrix': pdfdoc.PDFArray([1, 0, 0, 1, x, y]),
+                'Resources': pdfdoc.PDFDictionary({}),
+            }), cell))
+            color_space = pdfdoc.PDFArray([pdfdoc.PDFName('Pattern'), pdfdoc.PDFName('DeviceRGB')])
+
+        name = self.unique_form_name(pdf, 'tiles')
+        pdf.beginForm(name)
+        pdf.addLiteral(f'/PCS cs {fp_str(*self.grid_color[:3])} /P0 scn {fp_str(x, y, width, height)} re f')
+        self.end_form(pdf, ColorSpace={'PCS': color_space}, Pattern={'P0': pattern})
+        pdf.doForm(name)
 
     def draw_dotted(self, pdf):
         # Draw a dotted pattern
@@ -187,251 +479,51 @@ class PatternedPDF:
         pdf.setLineWidth(self.line_width)
 
         # Horizontal dotted lines
-        self.x1 = self.x_mesh_extended[0, 0]
-        self.x2 = self.x_mesh_extended[0, -1]
+        self.x1 = self.geometry.x[0]
+        self.x2 = self.geometry.x[-1]
 
         if self.margin[1] == 0:
-            self.x1 = self.x_mesh_extended[0, 1]
+            self.x1 = self.geometry.x[1]
         if self.margin[3] == 0 and self.x2 == self.paper_width:
-            self.x2 = self.x_mesh_extended[0, -1]
+            self.x2 = self.geometry.x[-1]
         if self.margin[1] == 0:
-            self.x2 = self.x_mesh_extended[0, -1] + self.grid_size
+            self.x2 = self.geometry.x[-1] + self.grid_size
 
-        self.draw_horizontal_lines(pdf)
+        if self.render_mode == 'tiling':
+            self.tile_dots(pdf)
+        else:
+            self.draw_horizontal_lines(pdf)
         
         pdf.setLineCap(0)
         pdf.setDash([])
 
     def draw_ruled(self, pdf):
         # Draw ruled lines
-        self.x1 = self.x_mesh_extended[0, 0]
-        self.x2 = self.x_mesh_extended[0, -1]
+        self.x1 = self.geometry.x[0]
+        self.x2 = self.geometry.x[-1]
         self.draw_horizontal_lines(pdf)
 
     def draw_blank(self, pdf):
         # Draw a blank page (no pattern)
         pass
     
-    def draw_table(self, pdf, title_index, cue_index_left, cue_index_right, summary_index):
-        # Draw a table within the pattern
-        if title_index != 0 and summary_index != 0:
-            row_height = (self.y_mesh_extended[summary_index, 0] - self.y_mesh_extended[title_index, 0]) / self.rows
-        elif title_index != 0:
-            row_height = (self.y_mesh_extended[-1, 0] - self.y_mesh_extended[title_index, 0]) / self.rows
-        elif summary_index != 0:
-            row_height = (self.y_mesh_extended[summary_index, 0] - self.y_mesh_extended[0, 0]) / self.rows
-        else:
-            row_height = self.pattern_height / self.rows
-        
-        if cue_index_left != 0 and cue_index_right != self.x_mesh_extended[0, -1]:
-            column_width = (self.x_mesh_extended[0, cue_index_right] - self.x_mesh_extended[0, cue_index_left]) / self.columns
-        elif cue_index_left != 0 and cue_index_right == self.x_mesh_extended[0, -1]:
-            column_width = (self.x_mesh_extended[0, -1] - self.x_mesh_extended[0, cue_index_left]) / self.columns
-        elif cue_index_left == 0 and cue_index_right != self.x_mesh_extended[0, -1]:
-            column_width = (self.x_mesh_extended[0, cue_index_right] - self.x_mesh_extended[0, 0]) / self.columns
-        else:
-            column_width = self.pattern_width / self.columns
-        
-        aa2 = round(column_width / self.grid_size - column_width // self.grid_size, 5)
-        
-            
-        if aa2 < 0.5:
-            column_width = column_width // self.grid_size * self.grid_size
-        elif aa2 >= 0.5:
-            column_width = (column_width // self.grid_size + 1) * self.grid_size
-        elif aa2 == 0.5:
-            pass
-        
-        
-        row_height = -(row_height // -self.grid_size + 1) * self.grid_size        
-        
-        
-        # draw horizontal lines
-        x2 = self.x_mesh_extended[0,-1]
-        
-        if cue_index_left == 0:
-            x1 = self.x_mesh_extended[0,0]
-        else:
-            x1 = self.x_mesh_extended[0, cue_index_left]
-        
-        if cue_index_right == 0:
-            x2 = self.x_mesh_extended[0,-1]
-        else:
-            x2 = self.x_mesh_extended[0, cue_index_right]
-        
-        for i in np.arange(self.rows - 1):
-            y = self.y_mesh_extended[0,0] + row_height * (i + 1)
-            pdf.line(x1, y, x2, y)
-        
-        # draw vertical lines
-        if cue_index_left == 0:
-            x1 = self.x_mesh_extended[0,0]
-        else:
-            x1 = self.x_mesh_extended[0, cue_index_left]
-        
-        if title_index == 0:
-            y1 = self.y_mesh_extended[0, 0]
-        else:
-            y1 = self.y_mesh_extended[title_index, 0] + self.line_width/2
-
-        if summary_index == self.grid_rows:
-            y2 = self.y_mesh_extended[-1, 0]
-        else:
-            y2 = self.y_mesh_extended[summary_index, 0]  - self.line_width/2
-
-        for j in np.arange(self.columns - 1):
-            x = x1 + column_width * (j + 1)
-            pdf.line(x, y1, x, y2)
-
-    def draw_title_line(self, pdf, title_index):
-        if title_index != 0:
-            x1 = self.x_mesh_extended[0, 0]
-            x2 = self.x_mesh_extended[0, -1]
-            y1 = self.y_mesh_extended[title_index, 0]
-            pdf.line(x1, y1, x2, y1)        # title line
-            
-            self.cue_y1 = y1 + self.line_width/2
-
-    def draw_summary_line(self, pdf, summary_index):
-        if summary_index != self.grid_rows:
-            x1 = self.x_mesh_extended[0, 0]
-            x2 = self.x_mesh_extended[0, -1]
-            y1 = self.y_mesh_extended[summary_index, 0]
-            pdf.line(x1, y1, x2, y1)        # summary line
-            
-            self.cue_y2 = y1 - self.line_width/2
-
-    def draw_cue_line(self, pdf, cue_index, cue_y1, cue_y2):
-        if cue_index != 0 and cue_index != self.grid_columns:
-            x1 = self.x_mesh_extended[0, cue_index]
-            y1 = self.cue_y1
-            y2 = self.cue_y2
-            pdf.line(x1, y1, x1, y2)        # cue line
-
-
-# Example Usage:
-output_folder   = 'templates/A4 7.5mm white - P'
-pdf_name        = 'template 7.5 mm'      # if only single pdf is to be created
-
-paper_width     = 210
-paper_height    = 297
-
-pattern     = 'grid'  # 'grid' 'dotted' 'ruled' 'blank'
-pattern2    = 'table'
-
-# grid_color          = np.array([30, 30, 30, 255]) / 255
-# line_color          = np.array([196, 21, 30, 255]) / 255
-# bg_color            = np.array([0, 0, 0, 255]) / 255
-# table_color         = np.array([30, 30, 30, 255]) / 255
-# grid_color[3]       = 1                 # grid opacity
-# line_color[3]       = 1                 # line opacity
-# bg_color[3] = 1                         # bg opacity
-# table_color[3]      = 1                 # table opacity
-
-grid_color      = (210, 210, 210, 150)
-line_color      = (196, 21, 30)
-bg_color        = "#ffffff"
-table_color     = (210, 210, 210, 255)
-
-# these opacities will be overridden if the colors having opacity e.g. - rgba, hex with opacity #12345678
-grid_opacity    = 1                 # grid opacity
-line_opacity    = 0.7               # line opacity
-bg_opacity      = 0.4               # bg opacity
-table_opacity   = 0.1               # table opacity
-
-grid_size       = 7.5
-grid_line_width = 0.1
-line_width      = 0.25
-
-title_perc      = np.array([0,4])
-cue_perc_left   = np.array([0,5])
-cue_perc_right  = np.array([0,5])
-summary_perc    = np.array([0,15])
-
-rows    = 1
-columns = 2
-margin  = np.array([0, 0, 0, 0])
-
-
-
-grid_color          = convert_color.convert_color(grid_color, "rgba", grid_opacity) / 255
-line_color          = convert_color.convert_color(line_color, "rgba", line_opacity*255)/ 255
-bg_color            = convert_color.convert_color(bg_color, "rgba", bg_opacity*255)/ 255
-table_color         = convert_color.convert_color(table_color, "rgba", table_opacity*255)/ 255
-
-# ''' For single pdf '''
-
-# title_perc = np.array([5])
-# cue_perc_left = np.array([5])
-# cue_perc_right = np.array([10])
-# summary_perc = np.array([10])
-# patterned_pdf = PatternedPDF(output_folder, pdf_name, paper_width, paper_height, pattern, pattern2, grid_color, line_color,
-#                                 bg_color, table_color, grid_size, grid_line_width, line_width, cue_perc_left, cue_perc_right, summary_perc, title_perc,
-#                                 rows, columns, margin)
-# doc = patterned_pdf.create_patterned_pdf()
-# doc.save()
-
-
-''' For multiple pdf '''
-
-patterns = ['grid', 'dotted', 'blank', 'ruled']
-
-for title in title_perc:
-    for cue_left in cue_perc_left:
-        for cue_right in cue_perc_right:
-            for summary in summary_perc:
-                for pattern in patterns:
-                    pdf_name = f'{pattern} - (title, cue (L-R), summary) - ({title}, {cue_left}-{cue_right}, {summary})%'
-
-                    patterned_pdf = PatternedPDF(output_folder, pdf_name, paper_width, paper_height, pattern, pattern2, grid_color, line_color,
-                                                bg_color, table_color, grid_size, grid_line_width, line_width, cue_left, cue_right, summary, title,
-                                                rows, columns, margin)
-                    doc = patterned_pdf.create_patterned_pdf()
-                    doc.save()
-
-
-title_perc = np.array([4])
-cue_perc_left = np.array([0,15])
-cue_perc_right = np.array([0,15])
-summary_perc = np.array([0,15])
-output_folder2 = f'{output_folder}/cornell'
-
-for title in title_perc:
-    for cue_left in cue_perc_left:
-        for cue_right in cue_perc_right:
-            for summary in summary_perc:
-                for pattern in patterns:
-                    if cue_left != cue_right:
-                        pdf_name = f'{pattern} - (title, cue (L-R), summary) - ({title}, {cue_left}-{cue_right}, {summary})%'
-                        
-                        patterned_pdf = PatternedPDF(output_folder2, pdf_name, paper_width, paper_height, pattern, pattern2, grid_color, line_color,
-                                                    bg_color, table_color, grid_size, grid_line_width, line_width, cue_left, cue_right, summary, title,
-                                                    rows, columns, margin)
-                        doc = patterned_pdf.create_patterned_pdf()
-                        doc.save()
-
-
-# templates with coloums and rows - ######## to-do
-title_perc      = np.array([4])
-cue_perc_left   = np.array([5])
-cue_perc_right  = np.array([5])
-summary_perc    = np.array([0])
-rows    = 1
-columns = 2
-output_folder2  = f'{output_folder}/table'
-table_color     = (196, 21, 30, 255)
-table_color     = convert_color.convert_color(table_color, "rgba", table_opacity*255)/ 255
-
-for title in title_perc:
-    for cue_left in cue_perc_left:
-        for cue_right in cue_perc_right:
-            for summary in summary_perc:
-                for pattern in patterns:
-                    pdf_name = f'{pattern} - table {rows}x{columns}'
-                    
-                    patterned_pdf = PatternedPDF(output_folder2, pdf_name, paper_width, paper_height, pattern, pattern2, grid_color, line_color,
-                                                bg_color, table_color, grid_size, grid_line_width, line_width, cue_left, cue_right, summary, title,
-                                                rows, columns, margin)
-                    doc = patterned_pdf.create_patterned_pdf()
-                    doc.save()
-
+    def draw_table(self, pdf):
+        # Draw a table within the pattern, at the positions laid out by the page geometry: the
+        # lines between the rows as one path, and the segments between the columns as another
+        geometry = self.geometry
+        y = geometry.table_rows_y
+        self.stroke_segments(pdf, np.full_like(y, geometry.table_x1), y, np.full_like(y, geometry.table_x2), y)
+        x, y1, y2 = geometry.table_vertical
+        self.stroke_segments(pdf, x, y1, x, y2)
+
+    def draw_title_line(self, pdf):
+        if self.geometry.title_y is not None:
+            pdf.line(self.geometry.x[0], self.geometry.title_y, self.geometry.x[-1], self.geometry.title_y)       # title line
+
+    def draw_summary_line(self, pdf):
+        if self.geometry.summary_y is not None:
+            pdf.line(self.geometry.x[0], self.geometry.summary_y, self.geometry.x[-1], self.geometry.summary_y)   # summary line
+
+    def draw_cue_lines(self, pdf):
+        for x in self.geometry.cue_x:
+            pdf.line(x, self.geometry.cue_y1, x, self.geometry.cue_y2)      # cue line
@@ -0,0 +1,460 @@
+"""
+Minimal PDF writer for line-art templates.
+
+DirectCanvas implements the part of the reportlab canvas API that PatternedPDF uses
+(graphics state, transforms, RGB(A) colours, line width/cap/dash, rectangles, lines, standard-font text,
+literal operators, form XObjects, pages and outline bookmarks) and writes the objects, content streams, xref table and
+ExtGState alpha entries itself. Coordinates are formatted straight from NumPy arrays
+with format_numbers, and identical page content streams are written only once.
+"""
+import math
+import zlib
+import array
+import collections
+from lazy_modules import lazy_import
+
+np = lazy_import('numpy')
+pdfmetrics = lazy_import('reportlab.pdfbase.pdfmetrics')
+
+HEADER = b'%PDF-1.4\n%\x93\x8c\x8b\x9e\n'
+CATALOG, PAGES, EXT_G_STATES = 1, 2, 3      # object numbers reserved up front
+
+
+def format_numbers(values):
+    """
+    Format numbers as PDF reals, vectorized over a NumPy array.
+
+    Numbers keep the precision reportlab writes (about 7 significant digits: 6 decimals up
+    to 1, one fewer per digit before the point), so both backends draw the same shapes.
+
+    :param values:      Array-like of numbers
+    :return:            NumPy array of strings, e.g. ['0', '21.25984', '-3.5']
+    """
+    values = np.asarray(values, dtype=float)
+    magnitude = np.abs(values)
+    scale = 10.0 ** np.clip(6 - np.log10(np.maximum(magnitude, 1)).astype(int), 0, 6)
+    values = np.where(magnitude <= 1e-7, 0, np.round(values * scale) / scale) + 0.0    # + 0.0 turns -0.0 into 0.0
+    text = values.astype('U24')
+    whole = values == np.floor(values)
+    text[whole] = values[whole].astype(np.int64).astype(str)
+    small = ~whole & (np.abs(values) < 1e-4)          # would be written in exponent notation
+    text[small] = [fmt(value) for value in values[small].tolist()]
+    return text
+
+
+def fmt(*values):
+    """Format a few scalars like format_numbers, separated by spaces."""
+    text = []
+    for value in values:
+        magnitude = abs(value)
+        if magnitude <= 1e-7:
+            text.append('0')
+            continue
+        decimals = 6 if magnitude <= 1 else min(max(0, 6 - int(math.log10(magnitude))), 6)
+        s = ('%.*f' % (decimals, value)).rstrip('0').rstrip('.')
+        text.append('0' if s == '-0' else s)
+    return ' '.join(text)
+
+
+def pdf_string(text):
+    """Encode a string as a PDF literal string in WinAnsi (cp1252) encoding, for the standard fonts."""
+    text = text.encode('cp1252', 'replace').decode('latin-1')
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').replace('\r', '\\r').replace('\n', '\\n') + ')'
+
+
+def pdf_text(text):
+    """Encode a string as a PDF text string (UTF-16 with byte order mark, in hex)."""
+    return '<FEFF' + text.encode('utf-16-be').hex().upper() + '>'
+
+
+class DirectCanvas:
+    def __init__(self, filename, pagesize, pageCompression=1):
+        """
+        Start a PDF document.
+
+        :param filename:            Output path, or a binary file-like object
+        :param pagesize:            (width, height) of the pages in points (see setPageSize)
+        :param pageCompression:     Flate-compress the content streams
+        """
+        self.filename = filename
+        self.width, self.height = pagesize
+        self.compress = pageCompression
+        self.objects = {}               # object number -> bytes
+        self.next_object = EXT_G_STATES + 1
+        self.pages = []                 # object numbers of the page dictionaries
+        self.forms = {}                 # form name -> reference
+        self.ext_g_states = {}          # (key, value) -> resource name, shared by the whole document
+        self.fonts = {}                 # standard font name -> (resource name, reference)
+        self.font = ('Helvetica', 12)
+        self.streams = {}               # (dictionary, data) -> reference, to write identical streams once
+        self.shared = {}                # object body -> reference of objects added with shared=True
+        self.stack = []                 # accumulators of the enclosing streams while a form is recorded
+        self.bookmarks = {}             # bookmark key -> page index
+        self.outline = []               # (title, bookmark key, level) in document order
+        self.outline_root = None        # reference of the outline tree once it is written
+        self.outline_mode = False
+        self.start_stream()
+
+    # Document objects
+
+    def add_object(self, body, shared=False):
+        """
+        Add an object and return its reference.
+
+        :param body:        Object as bytes or str, without the obj/endobj wrapper
+        :param shared:      Reuse an identical object added before (e.g. the resources of repeated pages)
+        """
+        body = body.encode('latin-1') if isinstance(body, str) else body
+        if shared and body in self.shared:
+            return self.shared[body]
+        number = self.next_object
+        self.next_object += 1
+        self.objects[number] = body
+        if shared:
+            self.shared[body] = f'{number} 0 R'
+        return f'{number} 0 R'
+
+    def add_stream(self, dictionary, data, compress=None):
+        """
+        Add a stream object and return its reference. Identical streams are stored once.
+
+        :param dictionary:      Entries of the stream dictionary without Length and Filter, e.g. '/Type /Pattern ...'
+        :param data:            Stream content (str or bytes)
+        :param compress:        Flate-compress the data (default: the canvas setting)
+        """
+        data = data.encode('latin-1') if isinstance(data, str) else data
+        key = (dictionary, data)
+        if key not in self.streams:
+            if self.compress if compress is None else compress:
+                data = zlib.compress(data)
+                dictionary = f'{dictionary} /Filter /FlateDecode'
+            self.streams[key] = self.add_object(b'<< %s /Length %d >>\nstream\n%s\nendstream'
+                                                % (dictionary.encode('latin-1'), len(data), data))
+        return self.streams[key]
+
+    def resources(self, **extra):
+        # Resource dictionary of the stream being recorded: the shared ExtGState dictionary, the forms it
+        # draws and extra entries such as Pattern or ColorSpace given as {name: PDF object string}
+        entries = [f'/ExtGState {EXT_G_STATES} 0 R']
+        if self.forms_in_use:
+            entries.append('/XObject << ' + ' '.join(f'/{name} {self.forms[name]}'
+                                                      for name in sorted(self.forms_in_use)) + ' >>')
+        if self.fonts_in_use:
+            entries.append('/Font << ' + ' '.join('/%s %s' % self.fonts[name] for name in sorted(self.fonts_in_use)) + ' >>')
+        for kind, values in sorted(extra.items()):
+            entries.append(f'/{kind} << ' + ' '.join(f'/{name} {value}' for name, value in values.items()) + ' >>')
+        return '<< ' + ' '.join(entries) + ' >>'
+
+    # Content streams
+
+    def start_stream(self):
+        self.code = []
+        self.forms_in_use = set()
+        self.fonts_in_use = set()
+        self.stroke_alpha = 1
+        self.fill_alpha = 1
+        self.saved_states = []
+
+    def addLiteral(self, s):
+        self.code.append(s)
+
+    def set_alpha(self, key, alpha):
+        # Select an ExtGState with the given stroke (CA) or fill (ca) alpha, creating it on first use.
+        # Alpha is written in full: viewers quantize it to 8 bits, so 0.698039 would come out as 177/255, not 178/255
+        name = self.ext_g_states.setdefault((key, repr(float(alpha))), f'GS{len(self.ext_g_states)}')
+        self.code.append(f'/{name} gs')
+
+    def saveState(self):
+        self.code.append('q')
+        self.saved_states.append((self.stroke_alpha, self.fill_alpha))
+
+    def restoreState(self):
+        self.code.append('Q')
+        self.stroke_alpha, self.fill_alpha = self.saved_states.pop()
+
+    def transform(self, a, b, c, d, e, f):
+        self.code.append(f'{fmt(a, b, c, d, e, f)} cm')
+
+    def translate(self, dx, dy):
+        self.code.append(f'1 0 0 1 {fmt(dx, dy)} cm')
+
+    def scale(self, x, y):
+        self.code.append(f'{fmt(x)} 0 0 {fmt(y)} 0 0 cm')
+
+    def setFillColorRGB(self, r, g, b, alpha=None):
+        self.code.append(f'{fmt(r, g, b)} rg')
+        if alpha is not None and alpha != self.fill_alpha:
+            self.fill_alpha = alpha
+            self.set_alpha('ca', alpha)
+
+    def setStrokeColorRGB(self, r, g, b, alpha=None):
+        self.code.append(f'{fmt(r, g, b)} RG')
+        if alpha is not None and alpha != self.stroke_alpha:
+            self.stroke_alpha = alpha
+            self.set_alpha('CA', alpha)
+
+    def setLineWidth(self, width):
+        self.code.append(f'{fmt(width)} w')
+
+    def setLineCap(self, mode):
+        self.code.append(f'{int(mode)} J')
+
+    def setDash(self, array=[], phase=0):
+        self.code.append(f'[{fmt(*array) if len(array) else ""}] {fmt(phase)} d')
+
+    def rect(self, x, y, width, height, stroke=1, fill=0):
+        op = {(1, 1): 'B', (0, 1): 'f', (1, 0): 'S'}.get((bool(stroke), bool(fill)), 'n')
+        self.code.append(f'{fmt(x, y, width, height)} re {op}')
+
+    def line(self, x1, y1, x2, y2):
+        self.code.append(f'n {fmt(x1, y1)} m {fmt(x2, y2)} l S')
+
+    # Text, in one of the 14 standard fonts
+
+    def setFont(self, name, size):
+        self.font = (name, size)
+
+    def stringWidth(self, text):
+        return pdfmetrics.stringWidth(text, *self.font)
+
+    def drawString(self, x, y, text):
+        name, size = self.font
+        if name not in self.fonts:
+            self.fonts[name] = (f'F{len(self.fonts) + 1}', self.add_object(
+                f'<< /Type /Font /Subtype /Type1 /BaseFont /{name} /Encoding /WinAnsiEncoding >>'))
+        self.fonts_in_use.add(name)
+        self.code.append(f'BT /{self.fonts[name][0]} {fmt(size)} Tf {fmt(x, y)} Td {pdf_string(text)} Tj ET')
+
+    def drawRightString(self, x, y, text):
+        self.drawString(x - self.stringWidth(text), y, text)
+
+    def drawCentredString(self, x, y, text):
+        self.drawString(x - self.stringWidth(text) / 2, y, text)
+
+    # Form XObjects
+
+    def beginForm(self, name, lowerx=0, lowery=0, upperx=None, uppery=None):
+        # Record the following operators as a form XObject instead of page content
+        self.stack.append((self.code, self.forms_in_use, self.fonts_in_use, self.stroke_alpha, self.fill_alpha, self.saved_states,
+                           (name, lowerx, lowery, upperx, uppery)))
+        self.start_stream()
+
+    def endForm(self, **resources):
+        """
+        Finish the form started with beginForm.
+
+        :param resources:   Extra resource entries, e.g. Pattern={'P0': '12 0 R'}, ColorSpace={'PCS': '[/Pattern /DeviceRGB]'}
+        """
+        code, forms_in_use, fonts_in_use, stroke_alpha, fill_alpha, saved_states, (name, lowerx, lowery, upperx, uppery) = \
+            self.stack.pop()
+        bbox = fmt(lowerx, lowery, self.width if upperx is None else upperx, self.height if uppery is None else uppery)
+        self.forms[name] = self.add_stream(f'/Type /XObject /Subtype /Form /BBox [{bbox}] '
+                                           f'/Resources {self.resources(**resources)}', '\n'.join(self.code))
+        self.code, self.forms_in_use, self.fonts_in_use = code, forms_in_use, fonts_in_use
+        self.stroke_alpha, self.fill_alpha, self.saved_states = stroke_alpha, fill_alpha, saved_states
+
+    def doForm(self, name):
+        self.code.append(f'/{name} Do')
+        self.forms_in_use.add(name)
+
+    def hasForm(self, name):
+        return name in self.forms
+
+    # Pages and output
+
+    def setPageSize(self, size):
+        # Size of the pages (and forms) that follow, as (width, height) in points
+        self.width, self.height = size
+
+    def bookmarkPage(self, key):
+        # Name the current page as an outline destination
+        self.bookmarks[key] = len(self.pages)
+
+    def addOutlineEntry(self, title, key, level=0, closed=None):
+        # Add an outline (bookmark panel) entry pointing at a bookmarked page; levels nest like reportlab's
+        if level > (self.outline[-1][2] + 1 if self.outline else 0):
+            raise ValueError(f'Outline level {level} skips a level')
+        self.outline.append((title, key, level))
+
+    def showOutline(self):
+        # Open the outline panel when the document is viewed
+        self.outline_mode = True
+
+    def outline_objects(self):
+        # Write the outline entries as a tree of outline item objects and return the root reference
+        first = self.next_object
+        self.next_object += len(self.outline) + 1
+        root = f'{first} 0 R'
+        refs = [f'{first + 1 + n} 0 R' for n in range(len(self.outline))]
+
+        # Parent and children of every entry; None is the root
+        children = {None: []}
+        parents = []
+        path = []                   # indices of the open ancestors, one per level
+        for n, (_, _, level) in enumerate(self.outline):
+            del path[level:]
+            parent = path[-1] if path else None
+            parents.append(parent)
+            children[parent].append(n)
+            children[n] = []
+            path.append(n)
+
+        def descendants(n):
+            return sum(1 + descendants(child) for child in children[n])
+
+        for n, (title, key, _) in enumerate(self.outline):
+            siblings = children[parents[n]]
+            position = siblings.index(n)
+            entries = [f'/Title {pdf_text(title)}', f'/Parent {root if parents[n] is None else refs[parents[n]]}',
+                       f'/Dest [{self.pages[self.bookmarks[key]]} /Fit]']
+            if position > 0:
+                entries.append(f'/Prev {refs[siblings[position - 1]]}')
+            if position < len(siblings) - 1:
+                entries.append(f'/Next {refs[siblings[position + 1]]}')
+            if children[n]:
+                entries += [f'/First {refs[children[n][0]]}', f'/Last {refs[children[n][-1]]}', f'/Count {descendants(n)}']
+            self.objects[first + 1 + n] = ('<< ' + ' '.join(entries) + ' >>').encode('latin-1')
+        top = children[None]
+        self.objects[first] = (f'<< /Type /Outlines /First {refs[top[0]]} /Last {refs[top[-1]]} '
+                               f'/Count {descendants(None)} >>').encode('latin-1')
+        return root
+
+    def showPage(self):
+        contents = self.add_stream('', '\n'.join(self.code))
+        resources = self.add_object(self.resources(), shared=True)
+        self.pages.append(self.add_object(f'<< /Type /Page /Parent {PAGES} 0 R /MediaBox [0 0 {fmt(self.width, self.height)}] '
+                                          f'/Contents {contents} /Resources {resources} >>'))
+        self.start_stream()
+
+    def iter_pdfdata(self):
+        """Finish the document and yield it piece by piece (header, one object at a time, xref table and trailer)."""
+        if self.code:
+            self.showPage()
+        catalog = f'/Type /Catalog /Pages {PAGES} 0 R'
+        if self.outline and self.outline_root is None:
+            self.outline_root = self.outline_objects()
+        if self.outline_root is not None:
+            catalog += f' /Outlines {self.outline_root}'
+        if self.outline_mode:
+            catalog += ' /PageMode /UseOutlines'
+        self.objects[CATALOG] = f'<< {catalog} >>'.encode()
+        self.objects[PAGES] = f'<< /Type /Pages /Kids [{" ".join(self.pages)}] /Count {len(self.pages)} >>'.encode()
+        self.objects[EXT_G_STATES] = ('<< ' + ' '.join(f'/{name} << /{key} {value} >>'
+                                                       for (key, value), name in self.ext_g_states.items()) + ' >>').encode()
+
+        yield HEADER
+        offsets = []
+        position = len(HEADER)
+        for number in range(1, self.next_object):
+            offsets.append(position)
+            chunk = b'%d 0 obj\n%s\nendobj\n' % (number, self.objects[number])
+            yield chunk
+            position += len(chunk)
+
+        yield (b'xref\n0 %d\n0000000000 65535 f \n' % (len(offsets) + 1) +
+               b''.join(b'%010d 00000 n \n' % offset for offset in offsets) +
+               b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(offsets) + 1, CATALOG, position))
+
+    def getpdfdata(self):
+        """Return the finished document as bytes."""
+        return b''.join(self.iter_pdfdata())
+
+    def save(self):
+        if hasattr(self.filename, 'write'):
+            for chunk in self.iter_pdfdata():
+                self.filename.write(chunk)
+        else:
+            with open(self.filename, 'wb') as f:
+                for chunk in self.iter_pdfdata():
+                    f.write(chunk)
+
+
+class RecentDict(collections.OrderedDict):
+    """Dict that keeps only its most recently added entries."""
+
+    def __init__(self, size):
+        super().__init__()
+        self.size = size
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if len(self) > self.size:
+            self.popitem(last=False)
+
+
+class StreamingCanvas(DirectCanvas):
+    def __init__(self, pagesize, pageCompression=1, recent=64):
+        """
+        DirectCanvas that writes every object as soon as it is added, for documents of any length.
+
+        Take the written bytes with drain() while drawing (pending_size says how many are waiting)
+        and from finish() at the end. Memory stays
+        bounded: only the xref offsets and page numbers grow with the document (about 24 bytes per
+        page), and identical streams and shared objects are only recognised among the recent ones.
+
+        :param pagesize:            (width, height) of the pages in points
+        :param pageCompression:     Flate-compress the content streams
+        :param recent:              How many recent streams and shared objects are remembered for reuse
+        """
+        super().__init__(None, pagesize, pageCompression)
+        self.streams = RecentDict(recent)
+        self.shared = RecentDict(recent)
+        self.pages = array.array('Q')           # object numbers of the page dictionaries
+        self.offsets = array.array('Q', [0] * EXT_G_STATES)     # reserved objects are written by finish()
+        self.position = 0
+        self.pending = []
+        self.pending_size = 0
+        self.write(HEADER)
+
+    def write(self, data):
+        self.pending.append(data)
+        self.pending_size += len(data)
+        self.position += len(data)
+
+    def add_object(self, body, shared=False):
+        body = body.encode('latin-1') if isinstance(body, str) else body
+        if shared and body in self.shared:
+            return self.shared[body]
+        number = self.next_object
+        self.next_object += 1
+        self.offsets.append(self.position)
+        self.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+        if shared:
+            self.shared[body] = f'{number} 0 R'
+        return f'{number} 0 R'
+
+    def showPage(self):
+        contents = self.add_stream('', '\n'.join(self.code))
+        resources = self.add_object(self.resources(), shared=True)
+        self.pages.append(int(self.add_object(f'<< /Type /Page /Parent {PAGES} 0 R /MediaBox [0 0 {fmt(self.width, self.height)}] '
+                                              f'/Contents {contents} /Resources {resources} >>').split()[0]))
+        self.start_stream()
+
+    def drain(self):
+        """Return the bytes written since the last call."""
+        pending, self.pending, self.pending_size = self.pending, [], 0
+        return b''.join(pending)
+
+    def finish(self):
+        """Write the catalogue, page tree, ExtGState dictionary, xref table and trailer, yielding the remaining bytes."""
+        if self.code:
+            self.showPage()
+        self.offsets[CATALOG - 1] = self.position
+        self.write(b'%d 0 obj\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n' % (CATALOG, PAGES))
+        self.offsets[PAGES - 1] = self.position
+        self.write(b'%d 0 obj\n<< /Type /Pages /Kids [' % PAGES)
+        for start in range(0, len(self.pages), 4096):
+            self.write(b''.join(b'%d 0 R ' % number for number in self.pages[start:start + 4096]))
+            yield self.drain()
+        self.write(b'] /Count %d >>\nendobj\n' % len(self.pages))
+        self.offsets[EXT_G_STATES - 1] = self.position
+        self.write(b'%d 0 obj\n%s\nendobj\n' % (EXT_G_STATES, ('<< ' + ' '.join(
+            f'/{name} << /{key} {value} >>' for (key, value), name in self.ext_g_states.items()) + ' >>').encode('latin-1')))
+
+        xref = self.position
+        self.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(self.offsets) + 1))
+        for start in range(0, len(self.offsets), 4096):
+            self.write(b''.join(b'%010d 00000 n \n' % offset for offset in self.offsets[start:start + 4096]))
+            yield self.drain()
+        self.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(self.offsets) + 1, CATALOG, xref))
+        yield self.drain()
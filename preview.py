@@ -0,0 +1,300 @@
+"""
+PNG previews and thumbnails of templates, rasterized with NumPy.
+
+A template page is only axis-aligned lines, dots and rectangles at positions the page geometry
+already holds, so render_preview paints them straight into a NumPy image instead of going
+through a PDF and a PDF rasterizer. Every stroke or fill is composited with its own alpha in
+the order draw_page paints it (background, pattern, title/summary/cue lines, table), with
+anti-aliased edges from the exact pixel coverage of each line. Lines are covered along their
+length and across their width separately and dots are sampled 4 x 4 per pixel, and only the
+rows and columns a path touches are composited, so a preview costs a few array operations
+per path rather than per line or per page.
+
+    python -m generate_templates sweeps/a4_7.5mm_white.json --previews previews --dpi 36
+"""
+import os
+import zlib
+import struct
+
+from lazy_modules import lazy_import
+
+np = lazy_import('numpy')
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+DOT_SAMPLES = 4         # samples per pixel side when covering dots
+
+
+def interval_coverage(starts, ends, size):
+    """
+    Fraction of each pixel covered by a set of intervals, as seen along one axis.
+
+    :param starts:      Array of interval starts, in pixels
+    :param ends:        Array of interval ends, in pixels
+    :param size:        Number of pixels along the axis
+    :return:            Float32 array of size values in [0, 1]; where intervals overlap in a pixel their
+                        lengths add up, capped at 1
+    """
+    # Covered length up to t is sum(max(0, t - start)) - sum(max(0, t - end)), evaluated on the pixel
+    # edges with sorted ends and prefix sums
+    edges = np.arange(size + 1, dtype=float)
+
+    def ramp(points):
+        points = np.sort(points)
+        count = np.searchsorted(points, edges)
+        return count * edges - np.concatenate(([0.0], np.cumsum(points)))[count]
+
+    covered = np.diff(ramp(np.asarray(starts, dtype=float)) - ramp(np.asarray(ends, dtype=float)))
+    covered[covered < 1e-6] = 0         # rounding left over past the end of an interval
+    return np.minimum(covered, 1).astype(np.float32)
+
+
+def composite(image, color, coverage, rows, columns):
+    """
+    Paint a colour with alpha over part of the image, in proportion to the pixel coverage.
+
+    Only image[rows, columns] is read and written, so a path costs the pixels it touches.
+
+    :param image:       uint8 array (height, width, 3) of an opaque page, or (height, width, 4) with alpha
+    :param color:       (r, g, b, alpha)
+    :param coverage:    Float array of the shape of image[rows, columns] without its channels
+    :param rows:        Slice or array of row indices
+    :param columns:     Slice or array of column indices; when both are arrays they are combined with np.ix_
+    """
+    if not isinstance(rows, slice) and not isinstance(columns, slice):
+        rows, columns = np.ix_(rows, columns)
+    rgb = np.array(color[:3], dtype=np.float32) * 255
+    opacity = (coverage * np.float32(color[3]))[..., None]
+    region = image[rows, columns].astype(np.float32)
+    if image.shape[2] == 3:
+        region += opacity * (rgb - region)
+    else:
+        # Straight (not premultiplied) colours: blend weighted by the alpha already there
+        alpha = region[..., 3:] / 255
+        painted = opacity + alpha * (1 - opacity)
+        region[..., :3] = (rgb * opacity + region[..., :3] * alpha * (1 - opacity)) / np.where(painted > 0, painted, 1)
+        region[..., 3:] = painted * 255
+    image[rows, columns] = region + 0.5
+
+
+def covered(coverage):
+    # Indices of the non-zero entries of a 1-D coverage array, and those entries
+    indices = np.flatnonzero(coverage)
+    return indices, coverage[indices]
+
+
+def stroke_lines(image, positions, start, end, width, vertical, color, scale):
+    """
+    Composite one path of parallel axis-aligned lines with butt caps.
+
+    :param positions:   Positions of the lines across their direction, in points from the top left
+    :param start:       Start of the lines along their direction, in points
+    :param end:         End of the lines along their direction, in points
+    :param width:       Line width in points
+    :param vertical:    Vertical lines (x positions) rather than horizontal ones (y positions)
+    :param color:       (r, g, b, alpha)
+    :param scale:       Pixels per point
+    """
+    positions = np.asarray(positions, dtype=float) * scale
+    if len(positions) == 0:
+        return
+    height, width_pixels = image.shape[:2]
+    across_size, along_size = (width_pixels, height) if vertical else (height, width_pixels)
+    half = width * scale / 2
+    across, across_coverage = covered(interval_coverage(positions - half, positions + half, across_size))
+    along, along_coverage = covered(interval_coverage([start * scale], [end * scale], along_size))
+    if len(across) == 0 or len(along) == 0:
+        return
+
+    # Lines cover only the rows (or columns) across them; along them the coverage is one run
+    along = slice(along[0], along[-1] + 1)
+    if vertical:
+        composite(image, color, np.outer(along_coverage, across_coverage), along, across)
+    else:
+        composite(image, color, np.outer(across_coverage, along_coverage), across, along)
+
+
+def dot_distances(positions, radius, size):
+    """
+    Pixels within reach of dots along one axis, and the distance of their samples to the nearest dot.
+
+    :param positions:   Sorted dot centres along the axis, in pixels
+    :param radius:      Dot radius in pixels
+    :param size:        Number of pixels along the axis
+    :return:            (indices, squared distances of shape (len(indices), DOT_SAMPLES))
+    """
+    reach = int(np.ceil(2 * radius)) + 2
+    indices = (np.floor(positions - radius).astype(int)[:, None] + np.arange(reach)).ravel()
+    indices = np.unique(indices[(indices >= 0) & (indices < size)])
+    samples = indices[:, None] + (np.arange(DOT_SAMPLES) + 0.5) / DOT_SAMPLES
+    padded = np.concatenate(([-np.inf], positions, [np.inf]))
+    after = np.searchsorted(padded, samples)
+    return indices, np.minimum(samples - padded[after - 1], padded[after] - samples) ** 2
+
+
+def fill_dots(image, x, y, radius, color, scale):
+    """
+    Composite round dots centred on every combination of x and y positions, as one fill.
+
+    The dots form a grid, so a sample is inside a dot when its distances to the nearest dot
+    column and row make it so; only the rows and columns within reach of a dot are sampled.
+
+    :param x:       x positions in points from the left
+    :param y:       y positions in points from the top
+    :param radius:  Dot radius in points
+    :param color:   (r, g, b, alpha)
+    :param scale:   Pixels per point
+    """
+    height, width = image.shape[:2]
+    x = np.sort(np.asarray(x, dtype=float)) * scale
+    y = np.sort(np.asarray(y, dtype=float)) * scale
+    r = radius * scale
+    if len(x) == 0 or len(y) == 0 or r <= 0:
+        return
+    columns, dx = dot_distances(x, r, width)
+    rows, dy = dot_distances(y, r, height)
+    if len(columns) == 0 or len(rows) == 0:
+        return
+    inside = dy[:, None, :, None] + dx[None, :, None, :] <= r * r
+    composite(image, color, inside.mean(axis=(2, 3), dtype=np.float32), rows, columns)
+
+
+def render_preview(template, dpi=36, paper=(1, 1, 1)):
+    """
+    Rasterize a template page.
+
+    :param template:    PatternedPDF
+    :param dpi:         Resolution in pixels per inch
+    :param paper:       RGB colour under the page (what a viewer shows through a translucent
+                        background), or None for a transparent preview with an alpha channel
+    :return:            uint8 array of shape (height, width, 3) on paper, (height, width, 4) without
+    """
+    scale = dpi / 72
+    width = max(1, int(round(template.paper_width * scale)))
+    height = max(1, int(round(template.paper_height * scale)))
+
+    # Background: the page colour over the paper is the same for every pixel
+    pixel = np.zeros((1, 1, 4 if paper is None else 3), dtype=np.uint8)
+    if paper is not None:
+        pixel[:] = np.rint(np.array(paper) * 255)
+    composite(pixel, template.rgba(template.bg_color), np.ones((1, 1)), slice(None), slice(None))
+    image = np.frombuffer(bytearray(pixel.tobytes() * (height * width)), dtype=np.uint8)   # faster than broadcasting
+    image = image.reshape(height, width, pixel.shape[2])
+
+    # Pattern, in the paths draw_background strokes
+    geometry = template.geometry = template.create_geometry()
+    grid_color = template.rgba(template.grid_color)
+    if template.pattern in ('grid', 'ruled'):
+        stroke_lines(image, template.horizontal_line_positions(), geometry.x[0], geometry.x[-1],
+                     template.grid_line_width, False, grid_color, scale)
+    if template.pattern == 'grid':
+        stroke_lines(image, template.vertical_line_positions(), geometry.y[0], geometry.y[-1],
+                     template.grid_line_width, True, grid_color, scale)
+    elif template.pattern == 'dotted':
+        # Dots of line_width where draw_dotted's dash pattern puts them
+        x1, x2 = geometry.x[0], geometry.x[-1]
+        if template.margin[1] == 0:
+            x1, x2 = geometry.x[1], geometry.x[-1] + template.grid_size
+        period = template.grid_size + 0.0000001
+        dots = int((x2 - x1) // period) + 1 if x2 >= x1 else 0
+        fill_dots(image, x1 + period * np.arange(dots), template.horizontal_line_positions(),
+                  template.line_width / 2, grid_color, scale)
+
+    # Title, summary and cue lines, each its own stroke
+    line_color = template.rgba(template.line_color)
+    for y in (geometry.title_y, geometry.summary_y):
+        if y is not None:
+            stroke_lines(image, [y], geometry.x[0], geometry.x[-1], template.line_width, False, line_color, scale)
+    for x in geometry.cue_x:
+        stroke_lines(image, [x], geometry.cue_y1, geometry.cue_y2, template.line_width, True, line_color, scale)
+
+    # Table, in the two paths draw_table strokes; vertical segments are covered by their extent
+    if template.pattern2 == 'table':
+        table_color = template.rgba(template.table_color)
+        stroke_lines(image, geometry.table_rows_y, geometry.table_x1, geometry.table_x2, template.line_width, False,
+                     table_color, scale)
+        x, y1, y2 = geometry.table_vertical
+        extents, inverse = np.unique(np.stack([y1, y2], axis=1), axis=0, return_inverse=True)
+        for index, (top, bottom) in enumerate(extents):
+            stroke_lines(image, x[inverse.ravel() == index], top, bottom, template.line_width, True, table_color, scale)
+    return image
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def encode_png(pixels, level=6):
+    """
+    Encode an RGB or RGBA uint8 array as a PNG.
+
+    Rows are written with the Up filter (the difference from the row above), which turns the
+    repeated rows of a template into runs of zeros.
+
+    :param pixels:  uint8 array of shape (height, width, 3) or (height, width, 4)
+    :param level:   zlib compression level
+    :return:        PNG bytes
+    """
+    height, width, channels = pixels.shape
+    filtered = np.empty((height, width * channels + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    rows = pixels.reshape(height, -1)
+    filtered[0, 1:] = rows[0]
+    filtered[1:, 1:] = rows[1:] - rows[:-1]          # uint8 arithmetic wraps modulo 256
+    header = struct.pack('>IIBBBBB', width, height, 8, 6 if channels == 4 else 2, 0, 0, 0)
+    return (PNG_SIGNATURE + png_chunk(b'IHDR', header) +
+            png_chunk(b'IDAT', zlib.compress(filtered.tobytes(), level)) + png_chunk(b'IEND', b''))
+
+
+def preview_name(job):
+    """Path of a job's preview inside a previews folder: output_folder/pdf_name.png."""
+    from sweep import archive_name
+
+    return archive_name(job)[:-len('.pdf')] + '.png'
+
+
+def render_previews(chunk, folder, dpi):
+    # Render one PNG per group of jobs with the same page, writing it for every job of the group
+    from patternedPDF import PatternedPDF
+
+    for group in chunk:
+        data = encode_png(render_preview(PatternedPDF(**group[0]), dpi))
+        for job in group:
+            path = os.path.join(folder, preview_name(job))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+    return sum(len(group) for group in chunk)
+
+
+def write_previews(jobs, folder, dpi=36, workers=None, chunksize=None):
+    """
+    Write a PNG preview of every job's page, e.g. thumbnails of a whole sweep.
+
+    Jobs with the same page (background_key() + overlay_key()) share one rendered preview.
+
+    :param jobs:        List of dicts of PatternedPDF keyword arguments, e.g. from expand_grid
+    :param folder:      Folder of the previews, '<folder>/<output_folder>/<pdf_name>.png'
+    :param dpi:         Resolution in pixels per inch (36 gives 298 x 421 pixels for A4)
+    :param workers:     Number of worker processes (default: CPU count); 1 renders in this process
+    :param chunksize:   Groups of jobs sent to a worker at a time (default: about four chunks per worker)
+    :return:            Dict with the number of previews written and rendered
+    """
+    from patternedPDF import PatternedPDF
+
+    groups = {}
+    for job in jobs:
+        template = PatternedPDF(**job)
+        groups.setdefault(template.background_key() + template.overlay_key(), []).append(job)
+    groups = list(groups.values())
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(groups)))
+    chunksize = chunksize or max(1, len(groups) // (workers * 4))
+    chunks = [groups[i:i + chunksize] for i in range(0, len(groups), chunksize)]
+    if workers == 1:
+        written = sum(render_previews(chunk, folder, dpi) for chunk in chunks)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            written = sum(executor.map(render_previews, chunks, [folder] * len(chunks), [dpi] * len(chunks)))
+    return dict(previews=written, rendered=len(groups))
@@ -0,0 +1,235 @@
+"""
+Content-addressed cache of rendered templates.
+
+Each job is keyed by a hash of all its PatternedPDF arguments except the
+output location, plus the renderer version. Rendered PDFs are stored once per
+key under <cache>/objects, and <cache>/index.json records which output files
+hold which key. An unchanged template is skipped. A combination rendered
+before is copied back from the store instead of being rendered again.
+
+    python -m render_cache verify templates/.render_cache
+    python -m render_cache prune templates/.render_cache --max-entries 500
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import argparse
+import numbers
+
+INDEX_VERSION = 1
+OUTPUT_ARGUMENTS = ('output_folder', 'pdf_name', 'instrument')
+
+
+def renderer_version():
+    """
+    Version string of the renderer: the reportlab version and a hash of the PatternedPDF, page_geometry
+    and pdf_writer sources.
+    """
+    import reportlab
+    import pdf_writer
+    import page_geometry
+    from patternedPDF import PatternedPDF
+    source_hash = hashlib.sha256(inspect.getsource(PatternedPDF).encode() +
+                                 inspect.getsource(page_geometry).encode() +
+                                 inspect.getsource(pdf_writer).encode()).hexdigest()[:16]
+    return f'reportlab-{reportlab.Version}/PatternedPDF-{source_hash}'
+
+
+def canonical(value):
+    """Convert a PatternedPDF argument into plain JSON data that compares equal for equal inputs."""
+    if hasattr(value, 'tolist'):            # NumPy arrays and scalars
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): canonical(v) for k, v in value.items()}
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, numbers.Real):
+        return float(value)
+    raise TypeError(f'Cannot hash argument value {value!r}')
+
+
+def job_key(job, version=None):
+    """Content hash of a job's rendering inputs (every argument except output_folder, pdf_name and instrument)."""
+    from patternedPDF import PatternedPDF
+    bound = inspect.signature(PatternedPDF).bind(**job)
+    bound.apply_defaults()
+    inputs = {name: canonical(value) for name, value in bound.arguments.items() if name not in OUTPUT_ARGUMENTS}
+    payload = json.dumps({'renderer': version or renderer_version(), 'inputs': inputs},
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def job_path(job):
+    """Output file of a job, as PatternedPDF builds it."""
+    return f"{job['output_folder']}/{job['pdf_name']}.pdf"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RenderCache:
+    def __init__(self, path, max_entries=None, max_bytes=None):
+        """
+        Open (or create) a render cache.
+
+        :param path:            Cache directory, usually next to the output folder (e.g. templates/.render_cache)
+        :param max_entries:     Keep at most this many rendered PDFs in the store (least recently used are evicted)
+        :param max_bytes:       Keep at most this many bytes of rendered PDFs in the store
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = renderer_version()
+        self.index_path = os.path.join(path, 'index.json')
+        self.objects_path = os.path.join(path, 'objects')
+        self.entries = {}       # key -> {'size', 'sha256', 'renderer', 'last_used'}
+        self.outputs = {}       # output path -> key
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION:
+                self.entries = index['entries']
+                self.outputs = index['outputs']
+
+    def object_path(self, key):
+        return os.path.join(self.objects_path, key[:2], f'{key}.pdf')
+
+    def save(self):
+        """Apply the eviction policy and write the index."""
+        self.evict()
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'entries': self.entries, 'outputs': self.outputs}, f,
+                      indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def restore(self, jobs):
+        """
+        Satisfy jobs from the cache where possible.
+
+        :param jobs:    List of job dicts
+        :return:        (jobs still to render, number of jobs satisfied from the cache)
+        """
+        pending = []
+        hits = 0
+        now = time.time()
+        for job in jobs:
+            key = job_key(job, self.version)
+            path = job_path(job)
+            entry = self.entries.get(key)
+            if entry is None:
+                pending.append(job)
+                continue
+
+            if self.outputs.get(path) != key or not os.path.exists(path) or os.path.getsize(path) != entry['size']:
+                if not os.path.exists(self.object_path(key)):
+                    pending.append(job)
+                    continue
+                os.makedirs(job['output_folder'], exist_ok=True)
+                if os.path.lexists(path):
+                    os.remove(path)         # may be hardlinked to another output
+                shutil.copyfile(self.object_path(key), path)
+                self.outputs[path] = key
+
+            entry['last_used'] = now
+            hits += 1
+        return pending, hits
+
+    def store(self, job):
+        """Add the freshly rendered output of a job to the store."""
+        key = job_key(job, self.version)
+        path = job_path(job)
+        object_path = self.object_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        shutil.copyfile(path, object_path)
+        self.entries[key] = {'size': os.path.getsize(object_path), 'sha256': file_sha256(object_path),
+                             'renderer': self.version, 'last_used': time.time()}
+        self.outputs[path] = key
+
+    def remove(self, key):
+        self.entries.pop(key, None)
+        if os.path.exists(self.object_path(key)):
+            os.remove(self.object_path(key))
+
+    def evict(self):
+        """Drop least recently used entries until the entry-count and size limits hold."""
+        by_age = sorted(self.entries, key=lambda key: self.entries[key]['last_used'])
+        total = sum(entry['size'] for entry in self.entries.values())
+        while by_age and ((self.max_entries is not None and len(self.entries) > self.max_entries) or
+                          (self.max_bytes is not None and total > self.max_bytes)):
+            key = by_age.pop(0)
+            total -= self.entries[key]['size']
+            self.remove(key)
+
+    def verify(self):
+        """
+        Check the store and index against the files on disk.
+
+        :return:    List of (kind, name) problems: 'missing' or 'corrupt' objects, 'stale' entries from another
+                    renderer version, 'untracked' object files and 'orphaned' output records
+        """
+        problems = []
+        for key, entry in self.entries.items():
+            object_path = self.object_path(key)
+            if not os.path.exists(object_path):
+                problems.append(('missing', key))
+            elif os.path.getsize(object_path) != entry['size'] or file_sha256(object_path) != entry['sha256']:
+                problems.append(('corrupt', key))
+            elif entry['renderer'] != self.version:
+                problems.append(('stale', key))
+        if os.path.isdir(self.objects_path):
+            for folder in sorted(os.listdir(self.objects_path)):
+                for name in sorted(os.listdir(os.path.join(self.objects_path, folder))):
+                    if name[:-len('.pdf')] not in self.entries:
+                        problems.append(('untracked', os.path.join(folder, name)))
+        for path, key in self.outputs.items():
+            if key not in self.entries or not os.path.exists(path):
+                problems.append(('orphaned', path))
+        return problems
+
+    def prune(self):
+        """Remove every problem found by verify, then apply the eviction policy and save the index."""
+        problems = self.verify()
+        for kind, name in problems:
+            if kind in ('missing', 'corrupt', 'stale'):
+                self.remove(name)
+            elif kind == 'untracked':
+                os.remove(os.path.join(self.objects_path, name))
+            elif kind == 'orphaned':
+                del self.outputs[name]
+        self.outputs = {path: key for path, key in self.outputs.items() if key in self.entries}
+        self.save()
+        return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m render_cache', description='Verify or prune a render cache.')
+    parser.add_argument('command', choices=['verify', 'prune'])
+    parser.add_argument('path', help='cache directory, e.g. templates/.render_cache')
+    parser.add_argument('--max-entries', type=int, help='evict down to this many entries when pruning')
+    parser.add_argument('--max-bytes', type=int, help='evict down to this many bytes when pruning')
+    args = parser.parse_args(argv)
+
+    cache = RenderCache(args.path, args.max_entries, args.max_bytes)
+    problems = cache.verify() if args.command == 'verify' else cache.prune()
+    for kind, name in problems:
+        print(f'{kind:<10} {name}')
+    print(f'{len(cache.entries)} entries, {sum(e["size"] for e in cache.entries.values())} bytes, '
+          f'{len(problems)} problem(s) {"found" if args.command == "verify" else "removed"}')
+    return 1 if problems and args.command == 'verify' else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
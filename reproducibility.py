@@ -0,0 +1,123 @@
+"""
+Check that identical inputs give byte-identical PDFs.
+
+Every combination of pattern, table, render mode, page count and backend is rendered with
+reproducible=True in two fresh interpreters, started at least a second apart and with different
+hash seeds, and the SHA-256 hashes of the PDFs are compared. As a control, the same cases are
+rendered without reproducible=True; the reportlab backend then embeds the time of rendering, so
+its hashes are expected to differ (unless SOURCE_DATE_EPOCH is set).
+
+    python -m reproducibility                   # exits with status 1 when a case is not reproducible
+    python -m reproducibility --spec sweeps/a4_7.5mm_white.json
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import itertools
+import subprocess
+
+PATTERNS = ('grid', 'dotted', 'ruled', 'blank')
+TABLES = (None, 'table')
+RENDER_MODES = ('paths', 'tiling')
+PAGES = (1, 3)
+BACKENDS = ('reportlab', 'direct')
+
+
+def pattern_cases():
+    """One job per pattern, table, render mode, page count and backend, on A5 with translucent colours."""
+    cases = []
+    for pattern, table, render_mode, pages, backend in itertools.product(PATTERNS, TABLES, RENDER_MODES, PAGES, BACKENDS):
+        cases.append(dict(paper_width=148, paper_height=210, pattern=pattern, pattern2=table,
+                          grid_color=[0.8, 0.8, 0.8, 0.6], line_color=[0.77, 0.08, 0.12, 0.7],
+                          bg_color=[1, 1, 1, 1], table_color=[0.82, 0.82, 0.82, 1], grid_size=5,
+                          grid_line_width=0.1, line_width=0.25, cue_perc_left=15, cue_perc_right=0,
+                          summary_perc=15, title_perc=4, rows=3, columns=2, margin=[5, 7, 3, 11],
+                          render_mode=render_mode, pages=pages, backend=backend,
+                          pdf_name=f'{pattern} {table} {render_mode} {pages}p {backend}'))
+    return cases
+
+
+def render_hashes(cases, reproducible=True):
+    """SHA-256 of the PDF of each case (JSON-friendly job dicts), rendered in memory in this process."""
+    import numpy as np
+    from patternedPDF import PatternedPDF
+
+    hashes = []
+    for case in cases:
+        job = dict(case, output_folder=None, reproducible=reproducible)
+        for name in ('grid_color', 'line_color', 'bg_color', 'table_color', 'margin'):
+            job[name] = np.array(job[name], dtype=float)
+        hashes.append(hashlib.sha256(PatternedPDF(**job).to_bytes()).hexdigest())
+    return hashes
+
+
+def hashes_in_subprocess(cases, reproducible, seed):
+    # Render the cases in a fresh interpreter with the given hash seed and return their hashes
+    env = dict(os.environ, PYTHONHASHSEED=str(seed))
+    root = os.path.dirname(os.path.abspath(__file__))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    result = subprocess.run([sys.executable, '-m', 'reproducibility', '--hashes'] + ([] if reproducible else ['--control']),
+                            input=json.dumps(cases), capture_output=True, text=True, env=env)
+    if result.returncode:
+        raise RuntimeError(f'rendering the cases failed:\n{result.stderr}')
+    return json.loads(result.stdout)
+
+
+def compare_runs(cases, reproducible=True, runs=2):
+    """
+    Render the cases in separate interpreters and return the names of the cases whose hashes differ.
+
+    :param cases:           List of JSON-friendly job dicts (colours and margins as lists)
+    :param reproducible:    Render with reproducible=True
+    :param runs:            Number of interpreters, started at least a second apart
+    """
+    hashes = []
+    for run in range(runs):
+        if run:
+            time.sleep(1.1)         # PDF dates have a resolution of one second
+        hashes.append(hashes_in_subprocess(cases, reproducible, seed=run))
+    return [case['pdf_name'] for case, values in zip(cases, zip(*hashes)) if len(set(values)) > 1]
+
+
+def spec_cases(path):
+    # The jobs of a sweep specification as JSON-friendly dicts
+    from generate_templates import load_jobs
+
+    with open(path) as f:
+        jobs = load_jobs(json.load(f))
+    return [{name: value.tolist() if hasattr(value, 'tolist') else value for name, value in job.items()
+             if name != 'output_folder'} for job in jobs]
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m reproducibility',
+                                     description='Render every pattern twice and compare the PDF hashes.')
+    parser.add_argument('--spec', help='check the templates of a sweep specification instead of the pattern matrix')
+    parser.add_argument('--runs', type=int, default=2, help='number of separate renders to compare (default 2)')
+    parser.add_argument('--hashes', action='store_true', help=argparse.SUPPRESS)      # worker: cases on stdin
+    parser.add_argument('--control', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.hashes:
+        print(json.dumps(render_hashes(json.load(sys.stdin), reproducible=not args.control)))
+        return 0
+
+    cases = spec_cases(args.spec) if args.spec else pattern_cases()
+    differing = compare_runs(cases, reproducible=True, runs=args.runs)
+    for name in differing:
+        print(f'not reproducible: {name}')
+    print(f'{len(cases) - len(differing)}/{len(cases)} cases byte-identical over {args.runs} runs')
+
+    control = compare_runs(cases, reproducible=False, runs=2)
+    by_backend = {backend: sum(name.endswith(backend) for name in control) for backend in BACKENDS} if not args.spec else None
+    print(f'control without reproducible=True: {len(control)} cases differ' +
+          (f" ({', '.join(f'{backend} {count}' for backend, count in by_backend.items())})" if by_backend else ''))
+    return 1 if differing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import io
+import os
+import sys
+import time
+import zipfile
+import itertools
+
+from patternedPDF import PatternedPDF
+
+NO_OUTPUT_FOLDER = ('The job has no output_folder, so there is nowhere to save it; '
+                    'render it in memory with PatternedPDF.to_bytes() or stream_zip() instead')
+
+
+def expand_grid(grid, base=None, name_format=None, where=None):
+    """
+    Expand a parameter grid into one job per combination.
+
+    :param grid:            Dict of PatternedPDF argument name -> list of values to sweep
+    :param base:            Dict of PatternedPDF arguments shared by every job
+    :param name_format:     Format string for pdf_name, filled in with the job's arguments
+    :param where:           Optional predicate; combinations for which it returns False are skipped
+    :return:                List of dicts of PatternedPDF keyword arguments
+    """
+    keys = list(grid)
+    jobs = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        job = dict(base or {}, **dict(zip(keys, values)))
+        if where is not None and not where(job):
+            continue
+        if name_format is not None:
+            job['pdf_name'] = name_format.format(**job)
+        jobs.append(job)
+    return jobs
+
+
+def render_job(job):
+    """Render and save a single job."""
+    patterned_pdf = PatternedPDF(**job)
+    if patterned_pdf.pdf_path is None:
+        raise ValueError(NO_OUTPUT_FOLDER)
+    # An output hardlinked to a duplicate by an earlier sweep is replaced, not overwritten in place
+    if os.path.exists(patterned_pdf.pdf_path) and os.stat(patterned_pdf.pdf_path).st_nlink > 1:
+        os.remove(patterned_pdf.pdf_path)
+    patterned_pdf.create_patterned_pdf().save()
+
+
+def layout_groups(jobs):
+    """
+    Group jobs whose PDFs have the same pages, by PatternedPDF.layout_key().
+
+    :param jobs:    List of job dicts
+    :return:        List of lists of jobs, in order of first appearance; the first job of each group is rendered.
+                    A job whose layout cannot be worked out is a group of its own, so that rendering it reports the error
+    """
+    groups = {}
+    for index, job in enumerate(jobs):
+        try:
+            key = PatternedPDF(**job).layout_key()
+        except Exception:
+            key = ('invalid', index)
+        groups.setdefault(key, []).append(job)
+    return list(groups.values())
+
+
+def link_output(source, target):
+    """Make target the same file as source: a hardlink where possible, otherwise a copy."""
+    import shutil
+
+    if os.path.abspath(source) == os.path.abspath(target):
+        return
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def render_chunk(chunk):
+    """Render a chunk of (index, job) pairs, returning (index, error) pairs; error is None on success."""
+    import traceback
+
+    results = []
+    for index, job in chunk:
+        try:
+            render_job(job)
+            results.append((index, None))
+        except Exception:
+            results.append((index, traceback.format_exc()))
+    return results
+
+
+def print_progress(done, total, failed):
+    """Default progress reporter: a single updating line on stderr."""
+    sys.stderr.write(f'\r{done}/{total} rendered, {failed} failed')
+    if done == total:
+        sys.stderr.write('\n')
+    sys.stderr.flush()
+
+
+class SweepResult:
+    def __init__(self, jobs, failures, elapsed, cached=0, deduplicated=0):
+        """
+        Outcome of run_sweep.
+
+        :param jobs:        The jobs of the sweep
+        :param failures:    List of (job, traceback string) for the jobs that raised
+        :param elapsed:     Wall time of the sweep in seconds
+        :param cached:      Number of jobs satisfied from the render cache instead of being rendered
+        :param deduplicated: Number of jobs linked to the output of a job with the same layout instead of being rendered
+        """
+        self.jobs = jobs
+        self.failures = failures
+        self.elapsed = elapsed
+        self.cached = cached
+        self.deduplicated = deduplicated
+
+    @property
+    def succeeded(self):
+        return len(self.jobs) - len(self.failures)
+
+    def __repr__(self):
+        return (f'SweepResult({self.succeeded}/{len(self.jobs)} done in {self.elapsed:.2f} s, '
+                f'{self.cached} from cache, {self.deduplicated} renders saved by deduplication)')
+
+
+def run_sweep(jobs, workers=None, chunksize=None, progress=print_progress, cache=None, dedupe=True):
+    """
+    Render jobs across a process pool.
+
+    A failing job is recorded in the result and does not stop the rest of the sweep. So is a job
+    without an output folder, which is not rendered.
+
+    :param jobs:        List of dicts of PatternedPDF keyword arguments, e.g. from expand_grid
+    :param workers:     Number of worker processes (default: CPU count); 1 renders in this process
+    :param chunksize:   Jobs sent to a worker at a time (default: about four chunks per worker)
+    :param progress:    Callable progress(done, total, failed) called after every chunk, or None
+    :param cache:       Optional render_cache.RenderCache; unchanged jobs are skipped and new renders are stored
+    :param dedupe:      Render each distinct layout (see layout_groups) once and link the duplicates to it
+    :return:            SweepResult
+    """
+    start = time.perf_counter()
+    all_jobs = jobs
+    unsaved = [(job, NO_OUTPUT_FOLDER) for job in jobs if job.get('output_folder') is None]
+    pending = [job for job in jobs if job.get('output_folder') is not None]
+    cached = 0
+    if cache is not None:
+        pending, cached = cache.restore(pending)
+    groups = layout_groups(pending) if dedupe else [[job] for job in pending]
+    jobs = [group[0] for group in groups]
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+    if chunksize is None:
+        chunksize = max(1, len(jobs) // (workers * 4))
+
+    indexed = list(enumerate(jobs))
+    chunks = [indexed[i:i + chunksize] for i in range(0, len(indexed), chunksize)]
+    failures = list(unsaved)
+    failed = {}         # index -> traceback
+    done = 0
+
+    def collect(results):
+        nonlocal done
+        for index, error in results:
+            done += 1
+            if error is not None:
+                failures.append((jobs[index], error))
+                failed[index] = error
+        if progress is not None:
+            progress(done, len(jobs), len(failures))
+
+    if workers == 1:
+        for chunk in chunks:
+            collect(render_chunk(chunk))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for future in as_completed([executor.submit(render_chunk, chunk) for chunk in chunks]):
+                collect(future.result())
+
+    # Duplicates share the output of their group's rendered job, or its failure
+    for index, group in enumerate(groups):
+        for job in group[1:]:
+            if index in failed:
+                failures.append((job, failed[index]))
+            else:
+                link_output(PatternedPDF(**group[0]).pdf_path, PatternedPDF(**job).pdf_path)
+
+    if cache is not None:
+        for index, group in enumerate(groups):
+            if index not in failed:
+                for job in group:
+                    cache.store(job)
+        cache.save()
+
+    return SweepResult(all_jobs, failures, time.perf_counter() - start, cached, len(pending) - len(jobs))
+
+
+def archive_name(job):
+    """Path of a job's PDF inside a sweep archive: output_folder/pdf_name.pdf, as on disk."""
+    name = f"{job['pdf_name']}.pdf"
+    return f"{job['output_folder']}/{name}".lstrip('/') if job.get('output_folder') else name
+
+
+def render_bytes(job):
+    """Render a job in memory, returning (archive name, PDF bytes)."""
+    return archive_name(job), PatternedPDF(**job).to_bytes()
+
+
+class ChunkWriter(io.RawIOBase):
+    """Write-only, non-seekable stream that keeps what is written until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return b''.join(chunks)
+
+
+def fixed_date_time():
+    """Timestamp of reproducible archive entries: SOURCE_DATE_EPOCH if set, otherwise 1980-01-01 (the ZIP epoch)."""
+    epoch = os.environ.get('SOURCE_DATE_EPOCH', '').strip()
+    return time.gmtime(int(epoch))[:6] if epoch else (1980, 1, 1, 0, 0, 0)
+
+
+def stream_zip(jobs, workers=1, chunksize=1, compression=zipfile.ZIP_DEFLATED, date_time=None):
+    """
+    Render jobs in memory and yield a ZIP archive of all their PDFs, chunk by chunk.
+
+    Nothing is written to disk: each PDF goes straight from the renderer into the archive stream,
+    so only one rendered PDF per worker is held in memory. An exception in a job stops the stream.
+
+    :param jobs:            List of dicts of PatternedPDF keyword arguments, e.g. from expand_grid
+    :param workers:         Number of worker processes; 1 (default) renders in this process
+    :param chunksize:       Jobs sent to a worker at a time
+    :param compression:     zipfile compression method (ZIP_DEFLATED or ZIP_STORED)
+    :param date_time:       Timestamp (year, month, day, hour, minute, second) of every entry, e.g. fixed_date_time()
+                            for a reproducible archive; default the time each entry is written
+    :return:                Generator of bytes; the chunks joined are the archive
+    """
+    sink = ChunkWriter()
+    with zipfile.ZipFile(sink, 'w', compression=compression) as archive:
+        if workers == 1:
+            rendered = map(render_bytes, jobs)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(max_workers=workers)
+            rendered = executor.map(render_bytes, jobs, chunksize=chunksize)
+        try:
+            for name, data in rendered:
+                if date_time is not None:
+                    name = zipfile.ZipInfo(name, date_time)
+                    name.compress_type = compression
+                    name.external_attr = 0o600 << 16       # as writestr() sets for a name
+                archive.writestr(name, data)
+                yield sink.drain()
+        finally:
+            if workers != 1:
+                executor.shutdown(cancel_futures=True)
+    yield sink.drain()
@@ -0,0 +1,373 @@
+"""
+HTTP service rendering PatternedPDF templates on request.
+
+    python -m template_server --port 8000 --workers 4 --cache-mb 64
+    curl 'http://127.0.0.1:8000/template.pdf?pattern=dotted&paper=A5&grid_size=5&title=4&cue_left=15'
+    curl 'http://127.0.0.1:8000/stats'
+    python -m template_server --self-test          # start on a free localhost port and exercise the service
+
+Query parameters of /template.pdf (all optional):
+
+    pattern         grid, dotted, ruled or blank                              (grid)
+    paper           A6..A0 or WIDTHxHEIGHT in mm                              (A4)
+    grid_size, grid_line_width, line_width                            in mm  (5, 0.1, 0.25)
+    grid_color, line_color, bg_color, table_color    hex (d2d2d2 or #d2d2d2cc) or hsl(...)
+    grid_opacity, line_opacity, bg_opacity, table_opacity    0..1, for colours without alpha
+    margin          left,top,right,bottom in mm                               (0,0,0,0)
+    title, summary, cue_left, cue_right                   percentages        (0)
+    rows, columns   table size; the table is drawn when either is given
+    pages, render_mode, backend                                              (1, paths, direct)
+
+Rendering runs on a process pool, so the event loop never blocks. Concurrent requests for the
+same template (same arguments in any order or spelling) share one render, and recent outputs
+are kept in a byte-bounded LRU cache.
+"""
+import sys
+import json
+import math
+import asyncio
+import argparse
+import collections
+from urllib.parse import urlsplit, parse_qsl
+
+from page_geometry import PAPERS
+
+DEFAULTS = dict(pattern='grid', paper='A4', grid_size='5', grid_line_width='0.1', line_width='0.25',
+                grid_color='d2d2d2', line_color='000000', bg_color='ffffff', table_color='d2d2d2',
+                grid_opacity='1', line_opacity='1', bg_opacity='1', table_opacity='1', margin='0,0,0,0',
+                title='0', summary='0', cue_left='0', cue_right='0', pages='1', render_mode='paths', backend='direct')
+COLORS = ('grid', 'line', 'bg', 'table')
+MAX_PAGES = 1000
+MAX_REQUEST_BYTES = 16384
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def parse_number(query, name, kind=float, low=0, high=None):
+    try:
+        value = kind(query[name])
+    except ValueError:
+        raise ValueError(f'{name} must be a {"whole " if kind is int else ""}number, not {query[name]!r}')
+    if not math.isfinite(value):
+        raise ValueError(f'{name} must be a finite number, not {query[name]!r}')
+    if value < low or (high is not None and value > high):
+        raise ValueError(f'{name} must be between {low} and {high}' if high is not None else f'{name} must be at least {low}')
+    return value
+
+
+def parse_color(value):
+    # Hex without '#' is accepted so colours need no URL escaping
+    value = value.strip()
+    return value if value.startswith('#') or 'hsl' in value else f'#{value}'
+
+
+def job_from_query(query):
+    """
+    Turn /template.pdf query parameters into PatternedPDF keyword arguments.
+
+    :param query:   Dict of parameter name -> string value
+    :return:        Dict of PatternedPDF arguments, rendered in memory (output_folder=None)
+    """
+    import numpy as np
+    from convert_color import normalize_color
+
+    unknown = set(query) - set(DEFAULTS) - {'rows', 'columns'}
+    if unknown:
+        raise ValueError(f'Unknown parameter(s): {", ".join(sorted(unknown))}')
+    query = dict(DEFAULTS, **query)
+
+    if query['pattern'] not in ('grid', 'dotted', 'ruled', 'blank'):
+        raise ValueError(f"Unsupported pattern: {query['pattern']}")
+    if query['render_mode'] not in ('paths', 'tiling'):
+        raise ValueError(f"Unsupported render mode: {query['render_mode']}")
+    if query['backend'] not in ('reportlab', 'direct'):
+        raise ValueError(f"Unsupported backend: {query['backend']}")
+    if query['paper'] in PAPERS:
+        paper_width, paper_height = PAPERS[query['paper']]
+    else:
+        try:
+            paper_width, paper_height = (float(v) for v in query['paper'].lower().split('x'))
+        except ValueError:
+            raise ValueError(f"paper must be one of {', '.join(PAPERS)} or WIDTHxHEIGHT in mm, not {query['paper']!r}")
+        if not (10 <= paper_width <= 2000 and 10 <= paper_height <= 2000):
+            raise ValueError('paper sides must be between 10 and 2000 mm')
+    try:
+        margin = np.array([float(v) for v in query['margin'].split(',')])
+    except ValueError:
+        raise ValueError(f"margin must be four numbers in mm, not {query['margin']!r}")
+    if len(margin) != 4 or not np.isfinite(margin).all() or (margin < 0).any():
+        raise ValueError('margin must be four non-negative numbers in mm: left,top,right,bottom')
+    grid_size = parse_number(query, 'grid_size', low=0.5, high=100)
+    if margin[0] + margin[2] >= paper_width or margin[1] + margin[3] >= paper_height:
+        raise ValueError('margins must leave room on the paper: left + right below its width, top + bottom below its height')
+    if min(paper_width - margin[0] - margin[2], paper_height - margin[1] - margin[3]) < grid_size:
+        raise ValueError('the area inside the margins must hold at least one grid cell')
+
+    colors = {}
+    for name in COLORS:
+        colors[name] = normalize_color(parse_color(query[f'{name}_color']),
+                                       parse_number(query, f'{name}_opacity', high=1))
+
+    table = 'rows' in query or 'columns' in query
+    return dict(output_folder=None, pdf_name='template', paper_width=paper_width, paper_height=paper_height,
+                pattern=query['pattern'], pattern2='table' if table else None,
+                grid_color=colors['grid'], line_color=colors['line'], bg_color=colors['bg'], table_color=colors['table'],
+                grid_size=grid_size,
+                grid_line_width=parse_number(query, 'grid_line_width', high=10),
+                line_width=parse_number(query, 'line_width', high=10),
+                cue_perc_left=parse_number(query, 'cue_left', int, high=100),
+                cue_perc_right=parse_number(query, 'cue_right', int, high=100),
+                summary_perc=parse_number(query, 'summary', int, high=100),
+                title_perc=parse_number(query, 'title', int, high=100),
+                rows=parse_number(dict({'rows': '1'}, **query), 'rows', int, low=1, high=100),
+                columns=parse_number(dict({'columns': '1'}, **query), 'columns', int, low=1, high=100),
+                margin=margin, render_mode=query['render_mode'], pages=parse_number(query, 'pages', int, 1, MAX_PAGES),
+                backend=query['backend'])
+
+
+def render(job):
+    """Render a job to PDF bytes (runs in a worker process)."""
+    from patternedPDF import PatternedPDF
+    return PatternedPDF(**job).to_bytes()
+
+
+def warm_up():
+    """Worker initializer: import NumPy and reportlab before the first request arrives."""
+    import numpy
+    import reportlab.pdfgen.canvas
+    import patternedPDF
+
+
+class ByteLRU:
+    def __init__(self, max_bytes):
+        """
+        Least recently used cache of bytes values, bounded by their total size.
+
+        :param max_bytes:   Total size of the cached values; values larger than this are not cached
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = collections.OrderedDict()
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is not None:
+            self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        if key in self.items:
+            self.size -= len(self.items.pop(key))
+        self.items[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self.items.popitem(last=False)
+            self.size -= len(evicted)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class TemplateServer:
+    def __init__(self, workers=None, cache_bytes=64 << 20, executor=None):
+        """
+        Template service; call start() from a running event loop.
+
+        :param workers:         Worker processes for rendering (default: CPU count)
+        :param cache_bytes:     Size bound of the in-memory LRU cache of rendered PDFs
+        :param executor:        Executor to render on instead of a new process pool
+        """
+        if executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # Forked workers would inherit open client sockets and hold their connections open
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_up,
+                                           mp_context=multiprocessing.get_context(method))
+        self.executor = executor
+        self.cache = ByteLRU(cache_bytes)
+        self.in_flight = {}         # job key -> future of the render every identical request awaits
+        self.stats = collections.Counter()
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def get_pdf(self, job):
+        """Return (PDF bytes, 'hit' | 'miss' | 'coalesced') for a job, rendering it at most once at a time."""
+        from render_cache import job_key
+
+        key = job_key(job, version='server')
+        data = self.cache.get(key)
+        if data is not None:
+            self.stats['hits'] += 1
+            return data, 'hit'
+        if key in self.in_flight:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(self.in_flight[key]), 'coalesced'
+
+        self.stats['renders'] += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, render, job)
+        self.in_flight[key] = future
+        try:
+            data = await asyncio.shield(future)
+        finally:
+            del self.in_flight[key]
+        self.cache.put(key, data)
+        return data, 'miss'
+
+    async def handle(self, reader, writer):
+        # Serve one request per connection
+        try:
+            status, headers, body = await self.respond(reader)
+        except Exception as error:
+            status, headers, body = 500, {'Content-Type': 'text/plain'}, f'{type(error).__name__}: {error}\n'.encode()
+        self.stats[f'status {status}'] += 1
+        head = [f'HTTP/1.1 {status} {REASONS[status]}', f'Content-Length: {len(body)}', 'Connection: close']
+        head += [f'{name}: {value}' for name, value in headers.items()]
+        try:
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, reader):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+            return 400, {'Content-Type': 'text/plain'}, b'Malformed request\n'
+        if len(request) > MAX_REQUEST_BYTES:
+            return 400, {'Content-Type': 'text/plain'}, b'Request too large\n'
+        method, target, *_ = request.decode('latin-1').split('\r\n', 1)[0].split(' ') + ['', '']
+        url = urlsplit(target)
+
+        if url.path not in ('/template.pdf', '/stats'):
+            return 404, {'Content-Type': 'text/plain'}, b'Not found: use /template.pdf or /stats\n'
+        if method != 'GET':
+            return 405, {'Content-Type': 'text/plain', 'Allow': 'GET'}, b'Only GET is supported\n'
+        if url.path == '/stats':
+            stats = dict(self.stats, cached=len(self.cache), cache_bytes=self.cache.size, in_flight=len(self.in_flight))
+            return 200, {'Content-Type': 'application/json'}, json.dumps(stats, sort_keys=True).encode() + b'\n'
+
+        try:
+            job = job_from_query(dict(parse_qsl(url.query, keep_blank_values=True)))
+        except ValueError as error:
+            return 400, {'Content-Type': 'text/plain'}, f'{error}\n'.encode()
+        data, source = await self.get_pdf(job)
+        return 200, {'Content-Type': 'application/pdf', 'Content-Disposition': 'inline; filename="template.pdf"',
+                     'X-Cache': source}, data
+
+
+async def fetch(host, port, target, method='GET'):
+    """Minimal HTTP client for the self-test: return (status, headers, body)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'{method} {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.split(': ', 1) for line in lines[1:])
+    return int(lines[0].split(' ')[1]), headers, body
+
+
+async def self_test(workers=None):
+    """Start the service on a free localhost port, exercise it and report each check; return True if all pass."""
+    server = TemplateServer(workers=workers)
+    host, port = await server.start('127.0.0.1', 0)
+    print(f'serving on http://{host}:{port}')
+    results = []
+
+    def check(name, condition):
+        results.append(condition)
+        print(f'{"ok  " if condition else "FAIL"} {name}')
+
+    try:
+        target = '/template.pdf?pattern=dotted&paper=A5&grid_size=5&title=4&cue_left=15&grid_color=aaaaaa&grid_opacity=0.5'
+        responses = await asyncio.gather(*(fetch(host, port, target) for _ in range(20)))
+        check('20 concurrent identical requests all succeed', all(status == 200 for status, _, _ in responses))
+        check('they return the same PDF', len({body for _, _, body in responses}) == 1 and responses[0][2].startswith(b'%PDF'))
+        check('and share a single render', server.stats['renders'] == 1)
+        check('the other 19 were coalesced or served from the cache',
+              sum(headers['X-Cache'] in ('coalesced', 'hit') for _, headers, _ in responses) == 19)
+
+        reordered = '/template.pdf?grid_opacity=0.5&grid_color=%23AAAAAA&cue_left=15&title=4&grid_size=5.0&paper=A5&pattern=dotted'
+        status, headers, body = await fetch(host, port, reordered)
+        check('the same template spelled differently is a cache hit',
+              status == 200 and headers['X-Cache'] == 'hit' and body == responses[0][2] and server.stats['renders'] == 1)
+
+        status, headers, body = await fetch(host, port, '/template.pdf?pattern=grid&rows=3&columns=2&pages=5')
+        check('a different template is rendered', status == 200 and headers['X-Cache'] == 'miss' and server.stats['renders'] == 2)
+
+        status, _, body = await fetch(host, port, '/template.pdf?pattern=zigzag')
+        check('an invalid parameter is rejected with 400', status == 400 and b'pattern' in body)
+        status, _, body = await fetch(host, port, '/template.pdf?paper=A5&margin=0,0,300,0')
+        check('margins wider than the paper are rejected with 400', status == 400 and b'margins' in body)
+        status, _, body = await fetch(host, port, '/template.pdf?paper=A5&margin=70,100,70,100&grid_size=10')
+        check('a pattern area smaller than a grid cell is rejected with 400', status == 400 and b'grid cell' in body)
+        for query in ('margin=nan,1,1,1', 'grid_size=nan', 'line_opacity=nan', 'grid_color=hsl(1,2)', 'bg_color=hsl(1,2)'):
+            status, _, body = await fetch(host, port, f'/template.pdf?{query}')
+            check(f'{query} is rejected with 400', status == 400)
+        status, _, _ = await fetch(host, port, '/template.pdf?colour=red')
+        check('an unknown parameter is rejected with 400', status == 400)
+        status, _, _ = await fetch(host, port, '/nothing-here')
+        check('an unknown path gives 404', status == 404)
+        status, _, _ = await fetch(host, port, '/template.pdf', method='POST')
+        check('POST gives 405', status == 405)
+        status, _, body = await fetch(host, port, '/stats')
+        check('/stats reports the cache', status == 200 and json.loads(body)['cached'] == 2)
+
+        lru = ByteLRU(10)
+        lru.put('a', b'12345')
+        lru.put('b', b'12345')
+        lru.get('a')
+        lru.put('c', b'123')
+        lru.put('huge', b'x' * 11)
+        check('the LRU evicts least recently used values to stay within its byte bound',
+              lru.get('a') is not None and lru.get('b') is None and lru.get('c') is not None
+              and lru.get('huge') is None and lru.size == 8)
+    finally:
+        await server.close()
+    return all(results)
+
+
+async def serve(host, port, workers, cache_bytes):
+    server = TemplateServer(workers=workers, cache_bytes=cache_bytes)
+    host, port = await server.start(host, port)
+    print(f'serving on http://{host}:{port}/template.pdf', file=sys.stderr)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m template_server', description='Serve PatternedPDF templates over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, help='rendering processes (default: CPU count)')
+    parser.add_argument('--cache-mb', type=float, default=64, help='size of the in-memory cache of rendered PDFs')
+    parser.add_argument('--self-test', action='store_true', help='start on a free localhost port, run checks and exit')
+    args = parser.parse_args(argv)
+
+    if args.self_test:
+        return 0 if asyncio.run(self_test(args.workers)) else 1
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, int(args.cache_mb * (1 << 20))))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
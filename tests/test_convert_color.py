@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from convert_color import normalize_color, normalize_colors
+
+
+COLORS = ['#34a1eb', '#34A1EB', '#34a1eb80', '#3ae', '#3ae8', (52, 161, 235), [52, 161, 235], (52, 161, 235, 128),
+          np.array([52, 161, 235]), 'hsl(204, 82%, 56%)', 'hsl(0, 0%, 50%)', 'hsl(360,100,25)', 'hsl(120,\n60%, 70%)']
+
+
+@pytest.mark.parametrize('color', COLORS, ids=repr)
+@pytest.mark.parametrize('opacity', [1, 0.4, 0])
+def test_scalar_and_batch_paths_agree(color, opacity):
+    assert np.array_equal(normalize_color(color, opacity), normalize_colors([color], opacity)[0])
+
+
+def test_batch_of_mixed_formats_matches_scalar_path():
+    opacity = np.linspace(0, 1, len(COLORS))
+    batch = normalize_colors(COLORS, opacity)
+    assert batch.shape == (len(COLORS), 4)
+    for color, alpha, row in zip(COLORS, opacity, batch):
+        assert np.array_equal(normalize_color(color, alpha), row)
+
+
+@pytest.mark.parametrize('color, expected', [
+    ('#34a1eb', [52 / 255, 161 / 255, 235 / 255, 0.5]),
+    ('#34a1eb80', [52 / 255, 161 / 255, 235 / 255, 128 / 255]),
+    ((255, 0, 0), [1, 0, 0, 0.5]),
+    ((255, 0, 0, 51), [1, 0, 0, 0.2]),
+    ('hsl(0, 100%, 50%)', [1, 0, 0, 0.5]),
+])
+def test_alpha_of_the_colour_wins_over_opacity(color, expected):
+    assert np.allclose(normalize_color(color, 0.5), expected)
+
+
+@pytest.mark.parametrize('color', ['red', '#12345', '#ggg', 'hsl(1,2)', 'hsl()', (1, 2), [1, 2, 3, 4, 5]], ids=repr)
+def test_errors_are_the_same_on_both_paths(color):
+    with pytest.raises(ValueError) as scalar:
+        normalize_color(color)
+    with pytest.raises(ValueError) as batch:
+        normalize_colors([color])
+    assert str(scalar.value).split(':')[0] == str(batch.value).split(':')[0]
+
+
+def test_bad_hsl_string_does_not_shift_rows():
+    with pytest.raises(ValueError, match='HSL'):
+        normalize_colors(['hsl(1, 2\n3)', 'hsl(4', 'hsl(5, 6, 7)'])
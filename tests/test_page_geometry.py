@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from page_geometry import PageGeometry
+from patternedPDF import mm
+
+
+def table_geometry(title_perc=0, summary_perc=0, rows=4, columns=3, **options):
+    # A5 portrait, 5 mm grid, 5 mm margins
+    return PageGeometry(148 * mm, 210 * mm, 5 * mm, (5 * mm,) * 4, title_perc, summary_perc, 0, 0, 0.25 * mm,
+                        rows, columns, **options)
+
+
+def test_rows_start_at_the_top_without_title():
+    geometry = table_geometry()
+    assert geometry.table_rows_y[0] > geometry.y[0]
+    assert geometry.table_y1 == geometry.y[0]
+
+
+@pytest.mark.parametrize('title_perc', [4, 30])
+def test_rows_stay_between_title_and_summary(title_perc):
+    geometry = table_geometry(title_perc, 15, rows=6, row_weights=[3, 2, 1, 1, 1, 1], header_bands=[[3], [1, 2]])
+    assert geometry.title_y is not None
+    assert (geometry.table_rows_y > geometry.title_y).all()
+    assert (geometry.table_rows_y < geometry.summary_y).all()
+    # Merged header segments start at or below the title line
+    x, y1, y2 = geometry.table_vertical
+    assert (y1 >= geometry.table_y1).all() and (y2 <= geometry.table_y2).all()
+
+
+def test_rows_follow_weights_in_whole_grid_cells():
+    geometry = table_geometry(rows=3, row_weights=[2, 1, 1])
+    heights = np.diff(np.concatenate(([geometry.y[0]], geometry.table_rows_y)))
+    assert heights[0] > heights[1]
+    assert np.allclose(heights / geometry.grid_size, np.round(heights / geometry.grid_size))
+
+
+def test_header_bands_break_column_lines():
+    geometry = table_geometry(rows=3, columns=3, header_bands=[[3]])
+    x, y1, y2 = geometry.table_vertical
+    assert len(x) == 2
+    assert (y1 == geometry.table_rows_y[0]).all()
+
+
+def test_every_row_a_header_band():
+    geometry = table_geometry(rows=2, columns=3, header_bands=[[3], [1, 2]])
+    x, y1, y2 = geometry.table_vertical
+    assert x.tolist() == [geometry.table_columns_x[0]]
+    assert y1[0] == geometry.table_rows_y[0] and y2[0] == geometry.table_y2
+
+
+@pytest.mark.parametrize('options', [dict(row_weights=[1, 1]), dict(column_weights=[1, 0, 1]),
+                                     dict(header_bands=[[1, 1]]), dict(header_bands=[[3]] * 5)])
+def test_unsupported_table_options(options):
+    with pytest.raises(ValueError, match='Unsupported'):
+        table_geometry(**options)
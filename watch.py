@@ -0,0 +1,222 @@
+"""
+Watch a sweep specification and keep its templates up to date while it is being edited.
+
+The specification file is polled for changes. On every change it is expanded again and the jobs are
+compared with those of the previous expansion, by output path and render_cache.job_key: only templates
+that are new or whose arguments changed are rendered, and outputs the specification no longer produces
+are deleted. Rendering happens on a pool of worker processes that is started once, with NumPy and
+reportlab already imported, so a change to one colour or percentage is on disk in well under a second.
+The first pass renders every template, or restores it from the specification's render cache.
+
+    python -m generate_templates sweeps/a4_7.5mm_white.json --watch
+"""
+import os
+import sys
+import json
+import time
+import traceback
+
+from render_cache import RenderCache, job_key, job_path, renderer_version
+from sweep import layout_groups, link_output, render_chunk
+
+
+def warm_up():
+    """Process pool initializer: load NumPy, reportlab and the renderer before the first job arrives."""
+    import patternedPDF
+
+    # The modules are imported lazily, on first attribute access
+    patternedPDF.np.zeros, patternedPDF.canvas.Canvas, patternedPDF.rl_accel.fp_str, patternedPDF.pdfdoc.PDFDocument
+
+
+def diff_jobs(old, new):
+    """
+    Compare two expansions of a specification.
+
+    :param old:     Dict of output path -> (job key, job) of the previous expansion
+    :param new:     Dict of output path -> (job key, job) of the current expansion
+    :return:        (jobs to render: new or changed, output paths no longer produced)
+    """
+    changed = [job for path, (key, job) in new.items() if path not in old or old[path][0] != key]
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+
+def remove_output(path):
+    # Delete an output and its folder once that is empty
+    if os.path.lexists(path):
+        os.remove(path)
+    try:
+        os.rmdir(os.path.dirname(path) or '.')
+    except OSError:
+        pass
+
+
+class WatchUpdate:
+    def __init__(self, rendered, restored, removed, failures, elapsed):
+        """
+        Outcome of one Watcher.update.
+
+        :param rendered:    Number of templates rendered or linked to an identical render
+        :param restored:    Number of templates copied back from the render cache
+        :param removed:     Number of outputs deleted
+        :param failures:    List of (job, traceback string) for the jobs that raised
+        :param elapsed:     Wall time of the update in seconds
+        """
+        self.rendered = rendered
+        self.restored = restored
+        self.removed = removed
+        self.failures = failures
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return (f'WatchUpdate({self.rendered} rendered, {self.restored} from cache, {self.removed} removed, '
+                f'{len(self.failures)} failed in {self.elapsed:.2f} s)')
+
+
+class Watcher:
+    def __init__(self, spec_path, workers=None, prepare=None, use_cache=True, dedupe=True):
+        """
+        Keep the templates of a sweep specification up to date.
+
+        :param spec_path:   Path of the specification (JSON, see generate_templates)
+        :param workers:     Number of worker processes (default: CPU count); 1 renders in this process
+        :param prepare:     Optional callable applied to the list of jobs of every expansion,
+                            e.g. to override the backend
+        :param use_cache:   Restore and store templates in the specification's render cache, if it has one
+        :param dedupe:      Render each distinct layout among the changed jobs once and link the duplicates to it
+        """
+        self.spec_path = spec_path
+        self.workers = workers or os.cpu_count() or 1
+        self.prepare = prepare
+        self.use_cache = use_cache
+        self.dedupe = dedupe
+        self.version = renderer_version()
+        self.jobs = {}          # output path -> (job key, job) of the templates on disk
+        self.stamp = None       # (mtime, size) of the specification when it was last read
+        self.cache = None
+        self.executor = None
+        if self.workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+            # Start every worker now rather than on the first change
+            for future in [self.executor.submit(warm_up) for _ in range(self.workers)]:
+                future.result()
+        else:
+            warm_up()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load(self):
+        """Read and expand the specification into a dict of output path -> (job key, job)."""
+        from generate_templates import load_jobs
+
+        with open(self.spec_path) as f:
+            spec = json.load(f)
+        if self.use_cache and spec.get('cache') and self.cache is None:
+            self.cache = RenderCache(spec['cache']['path'], spec['cache'].get('max_entries'),
+                                     spec['cache'].get('max_bytes'))
+        jobs = load_jobs(spec)
+        if self.prepare is not None:
+            jobs = self.prepare(jobs)
+        return {job_path(job): (job_key(job, self.version), job) for job in jobs}
+
+    def render(self, jobs):
+        # Render jobs on the pool, returning the (job, traceback) of those that failed
+        groups = layout_groups(jobs) if self.dedupe else [[job] for job in jobs]
+        chunks = [[(index, group[0])] for index, group in enumerate(groups)]
+        if self.executor is None:
+            results = [result for chunk in chunks for result in render_chunk(chunk)]
+        else:
+            results = [result for future in [self.executor.submit(render_chunk, chunk) for chunk in chunks]
+                       for result in future.result()]
+        failures = []
+        for index, error in results:
+            group = groups[index]
+            if error is not None:
+                failures += [(job, error) for job in group]
+                continue
+            for job in group[1:]:
+                link_output(job_path(group[0]), job_path(job))
+            if self.cache is not None:
+                for job in group:
+                    self.cache.store(job)
+        return failures
+
+    def update(self, jobs=None):
+        """
+        Bring the outputs in line with the specification: render new and changed templates, delete dropped ones.
+
+        :param jobs:    Expansion to apply (see load); by default the specification is read again
+        :return:        WatchUpdate
+        """
+        start = time.perf_counter()
+        jobs = self.load() if jobs is None else jobs
+        changed, removed = diff_jobs(self.jobs, jobs)
+        pending, restored = changed, 0
+        if self.cache is not None:
+            pending, restored = self.cache.restore(changed)
+        failures = self.render(pending) if pending else []
+        for path in removed:
+            remove_output(path)
+            if self.cache is not None:
+                self.cache.outputs.pop(path, None)
+        if self.cache is not None and (changed or removed):
+            self.cache.save()
+
+        # Failed templates are left out, so that the next change tries them again
+        failed = {job_path(job) for job, _ in failures}
+        self.jobs = {path: entry for path, entry in jobs.items() if path not in failed}
+        return WatchUpdate(len(pending), restored, len(removed), failures, time.perf_counter() - start)
+
+    def changed(self):
+        """True if the specification file was modified since it was last checked."""
+        try:
+            stat = os.stat(self.spec_path)
+        except FileNotFoundError:
+            return False            # editors may briefly remove the file while saving it
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        return True
+
+    def run(self, interval=0.2, report=None):
+        """
+        Poll the specification every `interval` seconds and update the outputs on every change, until interrupted.
+
+        :param interval:    Seconds between checks of the specification
+        :param report:      Callable report(update) called after every update (default: print_update)
+        """
+        report = report or print_update
+        try:
+            while True:
+                if self.changed():
+                    try:
+                        update = self.update()
+                    except Exception as e:
+                        # A specification saved half-way or with a typo: keep the outputs and wait for the next save
+                        print(f'{time.strftime("%H:%M:%S")} {self.spec_path}: '
+                              f'{"".join(traceback.format_exception_only(type(e), e)).strip()}', file=sys.stderr)
+                    else:
+                        report(update)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def print_update(update):
+    """Default reporter: one line per update on stderr, and the traceback of every failed template."""
+    for job, error in update.failures:
+        print(f"failed: {job_path(job)}\n{error}", file=sys.stderr)
+    print(f'{time.strftime("%H:%M:%S")} {update.rendered} rendered, {update.restored} from cache, '
+          f'{update.removed} removed, {len(update.failures)} failed in {update.elapsed:.2f} s', file=sys.stderr)